@@ -0,0 +1,288 @@
+"""Local stand-ins for Google Drive v3, Steam store/CDN and the discord.py objects /gen touches.
+
+Servers run on their own event loop in a background thread so their CPU time
+does not show up as lag on the bot's loop.
+"""
+import asyncio
+import itertools
+import json
+import re
+import threading
+import time
+
+import discord
+from aiohttp import web
+
+FOLDER_ID = "bench-folder"
+_NAME_CONTAINS = re.compile(r"name contains '([^']*)'")
+
+
+def _ts(i: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(1_600_000_000 + i))
+
+
+class FakeDrive:
+    """Drive v3 subset used by main.py: files.list/get/media, permissions.create, changes, OAuth token."""
+
+    def __init__(self, latency_ms: float = 0.0, file_size: int = 64 * 1024):
+        self.latency = latency_ms / 1000.0
+        self.file_size = file_size
+        self.files = {}        # id -> metadata (insertion order = listing order)
+        self.change_log = []   # [(file_id, removed)]
+        self.requests = 0
+        self._ids = itertools.count()
+
+    # --- mutations used by the bench driver ---
+    def add_file(self, name: str, size: int = None) -> str:
+        i = next(self._ids)
+        fid = f"f{i}"
+        self.files[fid] = {
+            "id": fid, "name": name, "parents": [FOLDER_ID], "trashed": False,
+            "createdTime": _ts(i), "modifiedTime": _ts(i), "size": str(size or self.file_size),
+        }
+        self.change_log.append((fid, False))
+        return fid
+
+    def touch_file(self, fid: str):
+        f = self.files[fid]
+        f["modifiedTime"] = _ts(len(self.change_log) + 10_000_000)
+        f["size"] = str(int(f["size"]) + 1)
+        self.change_log.append((fid, False))
+
+    def populate(self, n: int, first_appid: int = 10):
+        for appid in range(first_appid, first_appid + n):
+            self.add_file(f"{appid}.zip")
+
+    # --- HTTP handlers ---
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    async def token(self, request):
+        return web.json_response({"access_token": "bench-token", "expires_in": 3600, "token_type": "Bearer"})
+
+    async def list_files(self, request):
+        q = request.query.get("q", "")
+        page_size = int(request.query.get("pageSize", 100))
+        offset = int(request.query.get("pageToken", 0))
+        terms = _NAME_CONTAINS.findall(q)  # "(a or b or ...)" dari /genbatch
+        files = [f for f in self.files.values() if not f["trashed"]]
+        if terms:
+            files = [f for f in files if any(t in f["name"] for t in terms)]
+        page = files[offset:offset + page_size]
+        out = {"files": page}
+        if offset + page_size < len(files):
+            out["nextPageToken"] = str(offset + page_size)
+        return web.json_response(out)
+
+    async def get_file(self, request):
+        f = self.files.get(request.match_info["fid"])
+        if f is None:
+            return web.json_response({"error": {"code": 404}}, status=404)
+        if request.query.get("alt") == "media":
+            return web.Response(body=b"\0" * int(f["size"]), content_type="application/zip")
+        return web.json_response(dict(
+            f,
+            webContentLink=f"http://drive.invalid/uc?id={f['id']}",
+            webViewLink=f"http://drive.invalid/file/d/{f['id']}/view",
+            permissions=[{"type": "anyone", "role": "reader"}],
+        ))
+
+    async def create_permission(self, request):
+        return web.json_response({"id": "anyone", "type": "anyone", "role": "reader"})
+
+    async def start_page_token(self, request):
+        return web.json_response({"startPageToken": str(len(self.change_log))})
+
+    async def changes(self, request):
+        start = int(request.query["pageToken"])
+        page_size = int(request.query.get("pageSize", 100))
+        entries = self.change_log[start:start + page_size]
+        changes = []
+        for fid, removed in entries:
+            ch = {"fileId": fid, "removed": removed}
+            if not removed:
+                ch["file"] = self.files[fid]
+            changes.append(ch)
+        out = {"changes": changes}
+        if start + page_size < len(self.change_log):
+            out["nextPageToken"] = str(start + page_size)
+        else:
+            out["newStartPageToken"] = str(len(self.change_log))
+        return web.json_response(out)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/token", self.token)
+        app.router.add_get("/drive/v3/files", self.list_files)
+        app.router.add_get("/drive/v3/files/{fid}", self.get_file)
+        app.router.add_post("/drive/v3/files/{fid}/permissions", self.create_permission)
+        app.router.add_get("/drive/v3/changes/startPageToken", self.start_page_token)
+        app.router.add_get("/drive/v3/changes", self.changes)
+        return app
+
+
+class FakeSteam:
+    """Steam appdetails + header image CDN. Appids in `unknown` answer success=false."""
+
+    def __init__(self, base_url_ref: dict, latency_ms: float = 0.0, cdn_latency_ms: float = 0.0):
+        self.base_url_ref = base_url_ref  # filled in once the port is known
+        self.latency = latency_ms / 1000.0
+        self.cdn_latency = cdn_latency_ms / 1000.0
+        self.unknown = set()
+        self.requests = 0
+
+    async def appdetails(self, request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        appid = request.query["appids"]
+        if appid in self.unknown:
+            return web.json_response({appid: {"success": False}})
+        base = self.base_url_ref["url"]
+        return web.json_response({appid: {"success": True, "data": {
+            "name": f"Bench Game {appid}",
+            "developers": ["Bench Studio"],
+            "release_date": {"date": "1 Jan, 2024"},
+            "short_description": "Synthetic app used by the offline benchmark.",
+            "header_image": f"{base}/cdn/{appid}/header.jpg",
+        }}})
+
+    async def image(self, request):
+        self.requests += 1
+        if self.cdn_latency:
+            await asyncio.sleep(self.cdn_latency)
+        return web.Response(body=b"\xff\xd8\xff", content_type="image/jpeg")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/appdetails", self.appdetails)
+        app.router.add_route("*", "/cdn/{appid}/header.jpg", self.image)
+        return app
+
+
+class BackendThread:
+    """Runs aiohttp apps on 127.0.0.1 in a daemon thread; returns their base URLs."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._runners = []
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def serve(self, app: web.Application) -> str:
+        async def start():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            self._runners.append(runner)
+            return site._server.sockets[0].getsockname()[1]
+        port = asyncio.run_coroutine_threadsafe(start(), self.loop).result()
+        return f"http://127.0.0.1:{port}"
+
+    def call(self, fn, *args):
+        """Run a sync mutation on the backend loop (keeps fake state single-threaded)."""
+        async def run():
+            return fn(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+
+    def stop(self):
+        async def stop():
+            for r in self._runners:
+                await r.cleanup()
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+# =============== discord.py stubs ===============
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, latency_ms: float = 0.0):
+        self.id = channel_id
+        self.latency = latency_ms / 1000.0
+        self.sent = 0
+
+    async def send(self, content=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+
+
+class _FakeResponse:
+    def __init__(self):
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def send_message(self, *args, **kwargs):
+        self._done = True
+
+
+class _FakeFollowup:
+    def __init__(self, interaction, latency: float):
+        self.interaction = interaction
+        self.latency = latency
+
+    async def send(self, content=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        f = kwargs.get("file")
+        if isinstance(f, discord.File):
+            self.interaction.uploaded_bytes += len(f.fp.read())
+            f.close()
+        if content:
+            if content.startswith("⚠️ Error"):
+                self.interaction.errors.append(content)
+            elif content.startswith("🚦"):
+                self.interaction.outcome = "shed"
+            elif content.startswith("⌛"):
+                self.interaction.outcome = "timeout"
+            elif content.startswith("⏳"):
+                self.interaction.queued = True
+        self.interaction.messages += 1
+
+
+class FakeInteraction:
+    def __init__(self, guild_id: int, user_id: int, latency_ms: float = 0.0):
+        self.guild_id = guild_id
+        self.guild = None
+        self.user = FakeUser(user_id)
+        self.response = _FakeResponse()
+        self.followup = _FakeFollowup(self, latency_ms / 1000.0)
+        self.messages = 0
+        self.uploaded_bytes = 0
+        self.errors = []
+        self.outcome = "ok"    # "shed" / "timeout" dari reply scheduler /gen
+        self.queued = False    # sempat dapat pesan posisi antrian
+
+
+def fake_service_account(token_uri: str) -> str:
+    """GDRIVE_CREDENTIALS JSON with a throwaway RSA key; tokens come from FakeDrive /token."""
+    try:
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption()).decode()
+    except ImportError:
+        import rsa
+        _, priv = rsa.newkeys(2048)
+        pem = priv.save_pkcs1().decode()
+    return json.dumps({
+        "type": "service_account", "project_id": "bench", "private_key_id": "bench",
+        "private_key": pem, "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "1", "token_uri": token_uri,
+    })
@@ -0,0 +1,232 @@
+"""Offline benchmark for main.py: no Discord token, Drive folder or Steam API needed.
+
+    python bench/run.py --files 50000 --gen-requests 2000 --concurrency 50 --out /tmp/bench.json
+
+Starts FakeDrive/FakeSteam on localhost, points main.py at them through its
+env overrides, then measures:
+  bootstrap  initialize_known_files() over the whole synthetic folder
+  gen        /gen callback under --concurrency (hit + miss mix); latency/throughput cover
+             served requests only, shed/timeout/queued are counted separately
+  sync       check_new_files ticks with --changes-per-tick mutations, fanned out to --guilds
+  state_memory  bytes held by folder state (known_files, index, notified) per tracked file
+Prints one JSON document (also written to --out) so runs can be diffed across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import fakes  # noqa: E402
+
+
+def percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize(latencies, wall: float) -> dict:
+    return {
+        "count": len(latencies),
+        "wall_s": round(wall, 4),
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+    }
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+async def sample_loop_lag(stop: asyncio.Event, out: list, interval: float = 0.05):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        out.append(max(loop.time() - t0 - interval, 0.0))
+
+
+async def run_scenarios(main, args, backend, drive, steam) -> dict:
+    rng = random.Random(args.seed)
+    channels = {}
+
+    def get_channel(ch_id):
+        if ch_id not in channels:
+            channels[ch_id] = fakes.FakeChannel(ch_id, args.discord_latency_ms)
+        return channels[ch_id]
+
+    main.bot.get_channel = get_channel
+    for g in range(1, args.guilds + 1):
+        main.config[str(g)] = {"upload_channel": 10_000 + g, "update_channel": 20_000 + g,
+                               "request_channel": 30_000 + g, "request_role": None}
+
+    result = {}
+    lag = []
+    stop = asyncio.Event()
+    lag_task = asyncio.ensure_future(sample_loop_lag(stop, lag))
+
+    # --- bootstrap ---
+    t0 = time.perf_counter()
+    await main.initialize_known_files()
+    result["bootstrap"] = {"files": len(main.known_files), "wall_s": round(time.perf_counter() - t0, 4),
+                           "drive_requests": drive.requests}
+
+    # --- /gen ---
+    first, last = 10, 10 + args.files - 1
+    miss_base = last + 1_000_000
+    appids = []
+    for i in range(args.gen_requests):
+        if rng.random() < args.miss_ratio:
+            appid = str(miss_base + rng.randrange(args.hot_appids))
+            backend.call(steam.unknown.add, appid)
+        else:
+            appid = str(first + rng.randrange(min(args.hot_appids, args.files)))
+        appids.append(appid)
+
+    sem = asyncio.Semaphore(args.concurrency)
+    latencies = []  # hanya request yang benar-benar dilayani; shed/timeout/error tidak ikut
+    outcomes = {"ok": 0, "shed": 0, "timeout": 0, "error": 0}
+    queued = 0
+    drive_before, steam_before = drive.requests, steam.requests
+
+    async def one(i, appid):
+        nonlocal queued
+        async with sem:
+            inter = fakes.FakeInteraction(guild_id=1 + i % args.guilds, user_id=1 + i % args.users,
+                                          latency_ms=args.discord_latency_ms)
+            t = time.perf_counter()
+            await main.gen.callback(inter, appid)
+            elapsed = time.perf_counter() - t
+            queued += inter.queued
+            outcome = "error" if inter.errors else inter.outcome
+            outcomes[outcome] += 1
+            if outcome == "ok":
+                latencies.append(elapsed)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i, a) for i, a in enumerate(appids)))
+    result["gen"] = dict(summarize(latencies, time.perf_counter() - t0), errors=outcomes["error"],
+                         shed=outcomes["shed"], timeouts=outcomes["timeout"], queued=queued,
+                         scheduler_shed=main.gen_scheduler.shed,
+                         drive_requests=drive.requests - drive_before,
+                         steam_requests=steam.requests - steam_before)
+
+    # --- sync ticks ---
+    main.ENABLE_UPLOAD_WATCH = True
+    next_appid = [last + 1]
+
+    def mutate(n):
+        ids = list(drive.files)
+        for _ in range(n // 2):
+            drive.add_file(f"{next_appid[0]}.zip")
+            next_appid[0] += 1
+        for _ in range(n - n // 2):
+            drive.touch_file(rng.choice(ids))
+
+    tick_lat = []
+    sent_before = sum(c.sent for c in channels.values())
+    drive_before = drive.requests
+    t0 = time.perf_counter()
+    for _ in range(args.sync_ticks):
+        backend.call(mutate, args.changes_per_tick)
+        t = time.perf_counter()
+        await main.check_new_files.coro()
+        tick_lat.append(time.perf_counter() - t)
+    result["sync"] = dict(summarize(tick_lat, time.perf_counter() - t0),
+                          changes_per_tick=args.changes_per_tick,
+                          messages_sent=sum(c.sent for c in channels.values()) - sent_before,
+                          drive_requests=drive.requests - drive_before)
+
+    stop.set()
+    await lag_task
+    result["event_loop_lag"] = {"p50_ms": round(percentile(lag, 50) * 1000, 3),
+                                "p99_ms": round(percentile(lag, 99) * 1000, 3),
+                                "max_ms": round(max(lag, default=0.0) * 1000, 3)}
+    result["state_memory"] = main.memory_report()
+    await main.close_http_session()
+    return result
+
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--files", type=int, default=10_000, help="synthetic manifests in the fake folder")
+    ap.add_argument("--gen-requests", type=int, default=500)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--miss-ratio", type=float, default=0.1)
+    ap.add_argument("--hot-appids", type=int, default=200, help="distinct appids requested")
+    ap.add_argument("--users", type=int, default=100)
+    ap.add_argument("--guilds", type=int, default=20)
+    ap.add_argument("--sync-ticks", type=int, default=5)
+    ap.add_argument("--changes-per-tick", type=int, default=50)
+    ap.add_argument("--file-size", type=int, default=64 * 1024)
+    ap.add_argument("--drive-latency-ms", type=float, default=20.0)
+    ap.add_argument("--steam-latency-ms", type=float, default=30.0)
+    ap.add_argument("--cdn-latency-ms", type=float, default=10.0)
+    ap.add_argument("--discord-latency-ms", type=float, default=5.0)
+    ap.add_argument("--tracemalloc", action="store_true", help="also report peak Python heap (slower)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", help="write JSON result here as well as stdout")
+    args = ap.parse_args()
+
+    backend = fakes.BackendThread()
+    drive = fakes.FakeDrive(args.drive_latency_ms, args.file_size)
+    steam_ref = {}
+    steam = fakes.FakeSteam(steam_ref, args.steam_latency_ms, args.cdn_latency_ms)
+    drive_url = backend.serve(drive.app())
+    steam_ref["url"] = steam_url = backend.serve(steam.app())
+    backend.call(drive.populate, args.files)
+
+    workdir = tempfile.mkdtemp(prefix="manifest-bench-")
+    os.environ.update({
+        "GDRIVE_CREDENTIALS": fakes.fake_service_account(f"{drive_url}/token"),
+        "FOLDER_ID": fakes.FOLDER_ID,
+        "DRIVE_API_BASE": f"{drive_url}/drive/v3",
+        "STEAM_STORE_BASE": steam_url,
+        "HEADER_CDN_TEMPLATES": f"{steam_url}/cdn/{{appid}}/header.jpg",
+        "STATE_DB_FILE": os.path.join(workdir, "bot_state.db"),
+        "MANIFEST_CACHE_DIR": os.path.join(workdir, "manifest_cache"),
+        "STEAM_CACHE_FILE": "",
+    })
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    import main  # noqa: E402  (env must be set first)
+
+    result = asyncio.run(run_scenarios(main, args, backend, drive, steam))
+    backend.stop()
+
+    result["memory"] = {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    if args.tracemalloc:
+        result["memory"]["python_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    report = {"commit": git_rev(), "params": vars(args), **result}
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -2,40 +2,339 @@ import os
 import io
 import json
 import time
+import random
 import socket
+import sys
+import asyncio
+import bisect
+import hashlib
+import hmac
+import base64
+import re
+import sqlite3
+import tempfile
+import zipfile
+import subprocess
+import threading
 import traceback
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+from collections import deque
 import discord
 from discord.ext import tasks
 from discord import app_commands
-from flask import Flask
-from threading import Thread
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google.auth.transport.requests import Request as GoogleAuthRequest
 import aiohttp
-import requests
+from aiohttp import web
 from typing import Optional
+from urllib.parse import quote
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from collections import OrderedDict
 
 # ====== Global network guard: jangan pernah hang lama ======
 socket.setdefaulttimeout(20)  # semua koneksi network default timeout 20s
 
-# =============== KEEP-ALIVE (OPTIONAL) ===============
-app = Flask(__name__)
+# =============== METRICS (Prometheus text format) ===============
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
 
-@app.route("/")
-def home():
-    return "Bot is alive!"
+def _fmt_labels(labelnames, values, extra=None) -> str:
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
 
-def run_web():
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # bisa dibaca dari thread lain (watchdog, cluster)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(k, "")) for k in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_one(key, value))
+        return lines
+
+    def _render_one(self, key, value) -> list:
+        return [f"{self.name}{_fmt_labels(self.labelnames, key)} {value}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    st[0][i] += 1
+            st[1] += value
+            st[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def _render_one(self, key, value) -> list:
+        counts, total, n = value
+        lines = [f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', b)])} {c}"
+                 for b, c in zip(self.buckets, counts)]
+        lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, [('le', '+Inf')])} {n}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {total}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {n}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []  # fn() -> iterable (name, help, kind, labels dict, value); dihitung saat scrape
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        families = OrderedDict()  # sample dengan nama sama harus berurutan dalam satu family
+        for fn in self._collectors:
+            try:
+                samples = list(fn())
+            except Exception as e:
+                print("metrics collector error:", e)
+                continue
+            for name, help_text, kind, labels, value in samples:
+                fam = families.setdefault(name, [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+                fam.append(f"{name}{_fmt_labels(tuple(labels), tuple(labels.values()))} {value}")
+        for fam in families.values():
+            lines.extend(fam)
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+GEN_STAGE_SECONDS = metrics.add(Histogram("gen_stage_seconds", "Latency per /gen stage", ("stage",)))
+GENBATCH_STAGE_SECONDS = metrics.add(Histogram("genbatch_stage_seconds", "Latency per /genbatch stage (whole batch)",
+                                               ("stage",)))
+GEN_REQUESTS = metrics.add(Counter("gen_requests_total", "/gen requests by outcome", ("result",)))
+SYNC_TICK_SECONDS = metrics.add(Histogram("sync_tick_seconds", "check_new_files tick duration"))
+SYNC_FILES_SCANNED = metrics.add(Counter("sync_files_scanned_total", "Drive change entries / files processed by sync"))
+SYNC_EVENTS = metrics.add(Counter("sync_events_total", "File events emitted by sync", ("kind",)))
+LOOP_LAG_SECONDS = metrics.add(Histogram("event_loop_lag_seconds", "asyncio event loop scheduling lag",
+                                         buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+
+LOOP_LAG_INTERVAL = 0.5
+
+async def monitor_loop_lag():
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG_SECONDS.observe(max(loop.time() - t0 - LOOP_LAG_INTERVAL, 0.0))
+
+# =============== WEB SERVER (aiohttp, di event loop bot) ===============
+# Satu loop dengan bot → handler bisa pakai cache/Drive client langsung, tanpa thread Flask.
+web_app = web.Application()
+_web_runner: Optional[web.AppRunner] = None
+
+async def home(request):
+    return web.Response(text="Bot is alive!")
+
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode(),
+                        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+web_app.router.add_get("/", home)
+web_app.router.add_get("/metrics", metrics_endpoint)
+
+# Endpoint /debug/* hanya aktif kalau DEBUG_TOKEN diset; wajib "Authorization: Bearer <token>"
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+
+def debug_authorized(request) -> bool:
+    auth = request.headers.get("Authorization", "")
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(auth.encode(), f"Bearer {DEBUG_TOKEN}".encode())
+
+async def start_web():
+    global _web_runner
     port = int(os.environ.get("PORT", "8080"))  # Render bind
-    app.run(host="0.0.0.0", port=port)
+    _web_runner = web.AppRunner(web_app, access_log=None)
+    await _web_runner.setup()
+    await web.TCPSite(_web_runner, "0.0.0.0", port).start()
+    print(f"Web server listening on :{port}")
 
-def keep_alive():
-    Thread(target=run_web, daemon=True).start()
+async def stop_web():
+    if _web_runner is not None:
+        await _web_runner.cleanup()
+
+# =============== LOOP STALL DETECTOR (opt-in, DIAG_STALL=1) ===============
+# Watchdog thread: kalau heartbeat di event loop telat > threshold, ambil stack thread loop
+# (sys._current_frames) → ketahuan call mana yang blocking. Diagregasi per call site.
+DIAG_STALL_ENABLED = os.getenv("DIAG_STALL", "0") == "1"
+DIAG_STALL_THRESHOLD = float(os.getenv("DIAG_STALL_THRESHOLD", "0.25"))
+DIAG_STALL_MAX_SITES = 200
+
+LOOP_STALLS = metrics.add(Counter("event_loop_stalls_total", "Event loop stalls longer than DIAG_STALL_THRESHOLD"))
+LOOP_BLOCKED_SECONDS = metrics.add(Counter("event_loop_blocked_seconds_total", "Time the event loop was held by stalls"))
+
+class StallDetector:
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.interval = max(threshold / 5, 0.01)
+        self.sites = {}  # site -> {"count", "total", "max", "stack"}
+        self._lock = threading.Lock()
+        self._beat = time.monotonic()
+        self._loop_thread = None
+        self._thread = None
+        self._heartbeat_task = None
+
+    def start(self):
+        """Dipanggil dari dalam event loop."""
+        if self._thread is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat_task = asyncio.ensure_future(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._thread.start()
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    def _call_site(stack) -> str:
+        """Frame paling dalam di main.py (kode kita) + frame paling dalam (library yang sebenarnya blocking)."""
+        own = next((fr for fr in reversed(stack) if fr.filename == __file__), None)
+        inner = stack[-1] if stack else None
+        parts = []
+        if own is not None:
+            parts.append(f"main.py:{own.lineno} {own.name}")
+        if inner is not None and inner is not own:
+            parts.append(f"{os.path.basename(inner.filename)}:{inner.lineno} {inner.name}")
+        return " → ".join(parts) or "unknown"
+
+    def _watch(self):
+        stalled_beat = None
+        samples = {}  # site -> [jumlah sample, stack] selama stall berjalan
+        while True:
+            time.sleep(self.interval)
+            beat = self._beat
+            if stalled_beat is not None and beat != stalled_beat:
+                # stall selesai → atribusikan ke site yang paling sering tersampling
+                site, (_, stack_text) = max(samples.items(), key=lambda kv: kv[1][0])
+                self._record(site, stack_text, max(beat - stalled_beat - self.interval, 0.0))
+                stalled_beat = None
+                samples = {}
+            if time.monotonic() - beat > self.threshold + self.interval:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                stack = traceback.extract_stack(frame)
+                site = self._call_site(stack)
+                if site in samples:
+                    samples[site][0] += 1
+                else:
+                    samples[site] = [1, "".join(traceback.format_list(stack[-12:]))]
+                stalled_beat = beat
+
+    def _record(self, site: str, stack_text: str, blocked: float):
+        LOOP_STALLS.inc()
+        LOOP_BLOCKED_SECONDS.inc(blocked)
+        with self._lock:
+            st = self.sites.get(site)
+            if st is None:
+                if len(self.sites) >= DIAG_STALL_MAX_SITES:
+                    return
+                st = self.sites[site] = {"count": 0, "total": 0.0, "max": 0.0, "stack": stack_text}
+            st["count"] += 1
+            st["total"] += blocked
+            if blocked > st["max"]:
+                st["max"] = blocked
+                st["stack"] = stack_text
+
+    def top(self, limit: int = 10) -> list:
+        with self._lock:
+            items = [(site, dict(st)) for site, st in self.sites.items()]
+        return sorted(items, key=lambda kv: kv[1]["total"], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.sites.clear()
+
+stall_detector = StallDetector(DIAG_STALL_THRESHOLD) if DIAG_STALL_ENABLED else None
+
+async def stalls_endpoint(request):
+    if not debug_authorized(request):
+        raise web.HTTPUnauthorized(text="Butuh Authorization: Bearer <DEBUG_TOKEN>.")
+    try:
+        limit = min(max(int(request.query.get("limit", "20")), 1), DIAG_STALL_MAX_SITES)
+    except ValueError:
+        raise web.HTTPBadRequest(text="limit harus angka.")
+    return web.json_response({
+        "threshold_s": DIAG_STALL_THRESHOLD,
+        "top": [{"site": site, "count": st["count"], "total_s": round(st["total"], 4),
+                 "max_s": round(st["max"], 4), "stack": st["stack"]} for site, st in stall_detector.top(limit)],
+    })
+
+if stall_detector is not None and DEBUG_TOKEN:
+    web_app.router.add_get("/debug/stalls", stalls_endpoint)
 
 # =============== DISCORD SETUP ===============
 intents = discord.Intents.default()
 intents.guilds = True
-bot = discord.Client(intents=intents)
+
+# Sharding: SHARD_COUNT>0 atau AUTO_SHARD=1 → AutoShardedClient. SHARD_IDS = shard milik proses ini.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip()]
+CLUSTER_PROCESSES = int(os.getenv("CLUSTER_PROCESSES", "1"))
+WEB_ENABLED = os.getenv("WEB_ENABLED", "1") == "1"
+if SHARD_COUNT or os.getenv("AUTO_SHARD") == "1":
+    bot = discord.AutoShardedClient(intents=intents, shard_count=SHARD_COUNT or None, shard_ids=SHARD_IDS or None)
+else:
+    bot = discord.Client(intents=intents)
 tree = app_commands.CommandTree(bot)
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
@@ -50,20 +349,505 @@ if not SERVICE_ACCOUNT_INFO:
 creds = service_account.Credentials.from_service_account_info(
     json.loads(SERVICE_ACCOUNT_INFO), scopes=SCOPES
 )
-drive_service = build("drive", "v3", credentials=creds)
 
-# =============== CONFIG PERSISTENCE (per-guild) ===============
-CONFIG_FILE = "bot_config.json"
+# =============== SHARED HTTP SESSION ===============
+# Satu ClientSession long-lived untuk Drive, Steam, CDN (connection pooling + keep-alive).
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "64"))
+_http_session: Optional[aiohttp.ClientSession] = None
+
+async def get_http_session() -> aiohttp.ClientSession:
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_LIMIT, ttl_dns_cache=300)
+        )
+    return _http_session
+
+async def close_http_session():
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+
+def write_json_atomic(path: str, data):
+    """Tulis ke file sementara lalu os.replace → file lama tidak pernah setengah-tertulis.
+    Nama temp unik (mkstemp) → beberapa proses cluster yang menulis file sama tidak saling menimpa."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+# =============== ASYNC DRIVE CLIENT ===============
+# Semua akses Drive lewat sini (aiohttp), supaya event loop discord tidak pernah ke-block.
+DRIVE_API_BASE = os.getenv("DRIVE_API_BASE", "https://www.googleapis.com/drive/v3")
+DRIVE_MAX_CONCURRENCY = int(os.getenv("DRIVE_MAX_CONCURRENCY", "8"))
+DRIVE_CALL_TIMEOUT = float(os.getenv("DRIVE_CALL_TIMEOUT", "20"))
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", "4"))
+
+class DriveError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Drive API {status}: {message}")
+        self.status = status
+
+class AsyncDrive:
+    """Minimal Drive v3 client: concurrency cap, per-call timeout, retry + backoff on 429/5xx."""
+
+    def __init__(self, credentials, base_url: str, max_concurrency: int, timeout: float, max_retries: int):
+        self.creds = credentials
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._token_lock = asyncio.Lock()
+
+    async def auth_headers(self, force_refresh: bool = False) -> dict:
+        async with self._token_lock:
+            if force_refresh or not self.creds.valid:
+                # refresh() pakai requests (blocking) → jalankan di thread
+                await asyncio.to_thread(self.creds.refresh, GoogleAuthRequest())
+        return {"Authorization": f"Bearer {self.creds.token}"}
+
+    @staticmethod
+    def _is_retryable(status: int, body: str) -> bool:
+        if status == 429 or status >= 500:
+            return True
+        return status == 403 and ("rateLimitExceeded" in body or "userRateLimitExceeded" in body)
+
+    async def request(self, method: str, path: str, *, params: Optional[dict] = None, json_body: Optional[dict] = None):
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        delay = 1.0
+        force_refresh = False
+        last_err: Exception = DriveError(0, "no attempt made")
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                async with self._sem:
+                    session = await get_http_session()
+                    headers = await self.auth_headers(force_refresh)
+                    force_refresh = False
+                    async with session.request(method, url, params=params, json=json_body,
+                                               headers=headers, timeout=timeout) as resp:
+                        if resp.status < 400:
+                            return await resp.json(content_type=None)
+                        body = await resp.text()
+                        if resp.status == 401 and attempt == 0:
+                            force_refresh = True
+                            last_err = DriveError(resp.status, body[:300])
+                            continue
+                        if not self._is_retryable(resp.status, body):
+                            raise DriveError(resp.status, body[:300])
+                        last_err = DriveError(resp.status, body[:300])
+                        ra = resp.headers.get("Retry-After")
+                        if ra and ra.isdigit():
+                            retry_after = float(ra)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_err = e
+            if attempt < self.max_retries:
+                await asyncio.sleep(retry_after if retry_after is not None else delay + random.uniform(0, delay))
+                delay = min(delay * 2, 30.0)
+        raise last_err
+
+    async def list_files(self, q: str, fields: str, page_size: Optional[int] = None, page_token: Optional[str] = None) -> dict:
+        params = {"q": q, "fields": fields}
+        if page_size:
+            params["pageSize"] = page_size
+        if page_token:
+            params["pageToken"] = page_token
+        return await self.request("GET", "files", params=params)
+
+    async def get_start_page_token(self) -> str:
+        res = await self.request("GET", "changes/startPageToken")
+        return res["startPageToken"]
+
+    async def list_changes(self, page_token: str, fields: str, page_size: Optional[int] = None) -> dict:
+        params = {"pageToken": page_token, "fields": fields, "includeRemoved": "true", "spaces": "drive"}
+        if page_size:
+            params["pageSize"] = page_size
+        return await self.request("GET", "changes", params=params)
+
+    async def get_file(self, file_id: str, fields: str) -> dict:
+        return await self.request("GET", f"files/{file_id}", params={"fields": fields})
+
+    async def create_permission(self, file_id: str, body: dict) -> dict:
+        return await self.request("POST", f"files/{file_id}/permissions", json_body=body)
+
+drive = AsyncDrive(creds, DRIVE_API_BASE, DRIVE_MAX_CONCURRENCY, DRIVE_CALL_TIMEOUT, DRIVE_MAX_RETRIES)
+
+# =============== FILE RECORD (compact) ===============
+class FileRecord:
+    """State per file di folder. __slots__ (tanpa __dict__), size int, timestamp di-intern
+    (ctime == mtime untuk file yang belum pernah di-update → satu objek string)."""
+    __slots__ = ("id", "mtime", "ctime", "size")
+
+    def __init__(self, file_id: str, mtime: str = "", ctime: str = "", size: int = 0):
+        self.id = file_id
+        self.mtime = sys.intern(mtime or "")
+        self.ctime = sys.intern(ctime or "")
+        self.size = int(size or 0)
+
+    @classmethod
+    def from_drive(cls, f: dict) -> "FileRecord":
+        return cls(f["id"], f.get("modifiedTime", ""), f.get("createdTime", ""), f.get("size", 0))
+
+    def __repr__(self):
+        return f"FileRecord({self.id!r}, {self.mtime!r}, {self.ctime!r}, {self.size})"
+
+# =============== STATE STORE (SQLite WAL) ===============
+STATE_DB_FILE = os.getenv("STATE_DB_FILE", "bot_state.db")
+CONFIG_FILE = "bot_config.json"      # format lama, hanya untuk migrasi
+NOTIFIED_FILE = "notified.json"      # format lama, hanya untuk migrasi
+SYNC_STATE_FILE = "sync_state.json"  # format lama, hanya untuk migrasi
+GUILD_FIELDS = ("upload_channel", "update_channel", "request_channel", "request_role")
+
+class StateStore:
+    """Config guild, notified, sync token dan snapshot known_files dalam satu SQLite (WAL).
+    Write dibatch per transaksi; aman dipanggil dari thread lain (lock)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS guild_config (
+                guild_id TEXT PRIMARY KEY,
+                upload_channel INTEGER,
+                update_channel INTEGER,
+                request_channel INTEGER,
+                request_role INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS notified (
+                file_key TEXT PRIMARY KEY,
+                notified_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS known_files (
+                file_id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                mtime TEXT,
+                ctime TEXT,
+                size INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS known_files_name ON known_files(name);
+        """)
+
+    @contextmanager
+    def transaction(self):
+        """Satu transaksi; nested call ikut transaksi luar."""
+        with self._lock:
+            outer = self._depth == 0
+            if outer:
+                self.conn.execute("BEGIN IMMEDIATE")
+            self._depth += 1
+            try:
+                yield self.conn
+            except BaseException:
+                self._depth -= 1
+                if outer:
+                    self.conn.execute("ROLLBACK")
+                raise
+            self._depth -= 1
+            if outer:
+                self.conn.execute("COMMIT")
+
+    # --- guild config ---
+    def load_config(self) -> dict:
+        with self._lock:
+            rows = self.conn.execute(f"SELECT guild_id, {', '.join(GUILD_FIELDS)} FROM guild_config").fetchall()
+        return {r[0]: dict(zip(GUILD_FIELDS, r[1:])) for r in rows}
+
+    def save_guild(self, guild_id: str, conf: dict):
+        with self.transaction() as c:
+            c.execute(
+                f"INSERT OR REPLACE INTO guild_config (guild_id, {', '.join(GUILD_FIELDS)}) VALUES (?, ?, ?, ?, ?)",
+                (guild_id, *(conf.get(k) for k in GUILD_FIELDS))
+            )
+
+    # --- notified ---
+    def load_notified(self, since: float = 0.0) -> dict:
+        """file_id -> notified_at, hanya yang masih dalam masa retensi."""
+        with self._lock:
+            rows = self.conn.execute("SELECT file_key, notified_at FROM notified WHERE notified_at >= ?", (since,))
+            return dict(rows.fetchall())
+
+    def add_notified(self, keys):
+        now = time.time()
+        with self.transaction() as c:
+            c.executemany("INSERT OR IGNORE INTO notified (file_key, notified_at) VALUES (?, ?)",
+                          [(k, now) for k in keys])
+
+    def prune_notified(self, older_than: float):
+        with self.transaction() as c:
+            c.execute("DELETE FROM notified WHERE notified_at < ?", (older_than,))
+
+    # --- kv (sync token, dll) ---
+    def get_kv(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_kv(self, key: str, value: Optional[str]):
+        with self.transaction() as c:
+            c.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+
+    # --- snapshot known_files ---
+    def replace_known_files(self, files: dict):
+        with self.transaction() as c:
+            c.execute("DELETE FROM known_files")
+            c.executemany(
+                "INSERT OR REPLACE INTO known_files (file_id, name, mtime, ctime, size) VALUES (?, ?, ?, ?, ?)",
+                [(rec.id, name, rec.mtime, rec.ctime, rec.size) for name, rec in files.items()]
+            )
+
+    def upsert_known_file(self, name: str, rec: FileRecord):
+        with self.transaction() as c:
+            c.execute(
+                "INSERT OR REPLACE INTO known_files (file_id, name, mtime, ctime, size) VALUES (?, ?, ?, ?, ?)",
+                (rec.id, name, rec.mtime, rec.ctime, rec.size)
+            )
+
+    def delete_known_file(self, file_id: str):
+        with self.transaction() as c:
+            c.execute("DELETE FROM known_files WHERE file_id = ?", (file_id,))
+
+    def load_known_files(self) -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT file_id, name, mtime, ctime, size FROM known_files").fetchall()
+        return {name: FileRecord(fid, mtime, ctime, size) for fid, name, mtime, ctime, size in rows}
+
+    def migrate_json(self):
+        """Migrasi sekali dari bot_config.json / notified.json / sync_state.json lama."""
+        if self.get_kv("json_migrated"):
+            return
+        with self.transaction():
+            if os.path.exists(CONFIG_FILE):
+                with open(CONFIG_FILE, "r", encoding="utf-8") as f:
+                    for gid, conf in json.load(f).items():
+                        self.save_guild(gid, conf)
+            if os.path.exists(NOTIFIED_FILE):
+                with open(NOTIFIED_FILE, "r", encoding="utf-8") as f:
+                    self.add_notified(json.load(f))  # masih nama file → di-rekey migrate_notified_ids
+            if os.path.exists(SYNC_STATE_FILE):
+                with open(SYNC_STATE_FILE, "r", encoding="utf-8") as f:
+                    token = json.load(f).get("page_token")
+                if token:
+                    self.set_kv("page_token", token)
+            self.set_kv("json_migrated", "1")
+        for path in (CONFIG_FILE, NOTIFIED_FILE, SYNC_STATE_FILE):
+            if os.path.exists(path):
+                os.replace(path, f"{path}.migrated")
+                print(f"Migrated {path} → {self.path}")
+
+    def migrate_notified_ids(self):
+        """Migrasi sekali: tabel notified dulu di-key nama file (notified.json, versi lama), sekarang file_id.
+        Nama yang ada di snapshot known_files dipetakan ke id-nya; sisanya (id tidak diketahui) dibuang."""
+        if self.get_kv("notified_by_id"):
+            return
+        with self.transaction() as c:
+            c.execute("""
+                INSERT OR IGNORE INTO notified (file_key, notified_at)
+                SELECT k.file_id, n.notified_at FROM notified n JOIN known_files k ON k.name = n.file_key
+            """)
+            dropped = c.execute(
+                "DELETE FROM notified WHERE file_key NOT IN (SELECT file_id FROM known_files)"
+            ).rowcount
+            self.set_kv("notified_by_id", "1")
+        if dropped:
+            print(f"Notified: {dropped} entry lama tanpa file_id dibuang (anti-spam untuk file itu mulai dari nol)")
+
+store = StateStore(STATE_DB_FILE)
+store.migrate_json()
+store.migrate_notified_ids()
+
+# =============== CLUSTER BACKEND (shared state antar proses shard) ===============
+# memory = satu proses (default); sqlite = STATE_DB_FILE dipakai bersama semua proses di host yang sama
+CLUSTER_BACKEND = os.getenv("CLUSTER_BACKEND", "memory")
+LEADER_LEASE_SECONDS = float(os.getenv("LEADER_LEASE_SECONDS", "180"))
+EVENT_RETENTION_SECONDS = 24 * 3600
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}:{random.randrange(1 << 32):08x}"
+
+class ClusterBackend(ABC):
+    """Backend bersama antar proses: leader election, stream event file, L2 cache Steam, flag global.
+    Event = (event_id, kind, name, record, notify)."""
+
+    @abstractmethod
+    def try_acquire_leader(self, ttl: float) -> bool:
+        """Ambil / perpanjang lease leader selama ttl detik. True kalau proses ini leader."""
+
+    @abstractmethod
+    def publish_events(self, events: list):
+        """Tambah event [(kind, name, record, notify)] ke stream."""
+
+    @abstractmethod
+    def read_events(self, after_id: int, limit: int = 1000) -> list:
+        """Event dengan event_id > after_id, urut naik, maksimal limit."""
+
+    @abstractmethod
+    def last_event_id(self) -> int:
+        """event_id terakhir di stream (0 kalau kosong)."""
+
+    @abstractmethod
+    def prune_events(self, older_than: float):
+        """Hapus event yang dibuat sebelum timestamp older_than."""
+
+    @abstractmethod
+    def steam_get(self, appid: str):
+        """Entry L2 cache Steam yang belum expired (expires_at, ok, value), atau None."""
+
+    @abstractmethod
+    def steam_set(self, appid: str, expires_at: float, ok: bool, value: dict):
+        """Simpan entry L2 cache Steam."""
+
+    @abstractmethod
+    def get_flag(self, name: str, default):
+        """Nilai flag global, default kalau belum diset."""
+
+    @abstractmethod
+    def set_flag(self, name: str, value):
+        """Set flag global (terlihat oleh semua proses)."""
+
+class MemoryClusterBackend(ClusterBackend):
+    """Mode satu proses: selalu leader, stream event in-memory, tanpa L2 cache."""
+
+    MAX_EVENTS = 10000
+
+    def __init__(self):
+        self._events = deque()  # (event_id, created_at, kind, name, rec, notify)
+        self._next_id = 1
+        self._flags = {}
+
+    def try_acquire_leader(self, ttl: float) -> bool:
+        return True
+
+    def publish_events(self, events: list):
+        now = time.time()
+        for kind, name, rec, notify in events:
+            self._events.append((self._next_id, now, kind, name, rec, notify))
+            self._next_id += 1
+        while len(self._events) > self.MAX_EVENTS:
+            self._events.popleft()
+
+    def read_events(self, after_id: int, limit: int = 1000) -> list:
+        out = [(e[0], e[2], e[3], e[4], e[5]) for e in self._events if e[0] > after_id]
+        return out[:limit]
+
+    def last_event_id(self) -> int:
+        return self._next_id - 1
+
+    def prune_events(self, older_than: float):
+        while self._events and self._events[0][1] < older_than:
+            self._events.popleft()
+
+    def steam_get(self, appid: str):
+        return None
+
+    def steam_set(self, appid: str, expires_at: float, ok: bool, value: dict):
+        pass
 
+    def get_flag(self, name: str, default):
+        return self._flags.get(name, default)
+
+    def set_flag(self, name: str, value):
+        self._flags[name] = value
+
+class SqliteClusterBackend(ClusterBackend):
+    """Shared backend di atas StateStore (SQLite WAL aman dipakai banyak proses di satu host)."""
+
+    def __init__(self, state: StateStore):
+        self.store = state
+        with state.transaction() as c:
+            c.execute("""CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)""")
+            c.execute("""CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, kind TEXT NOT NULL,
+                name TEXT, file_id TEXT NOT NULL, mtime TEXT, ctime TEXT, size TEXT, notify INTEGER NOT NULL)""")
+            c.execute("CREATE INDEX IF NOT EXISTS events_created ON events(created_at)")
+            c.execute("""CREATE TABLE IF NOT EXISTS steam_cache (
+                appid TEXT PRIMARY KEY, expires_at REAL NOT NULL, ok INTEGER NOT NULL, value TEXT NOT NULL)""")
+
+    def try_acquire_leader(self, ttl: float) -> bool:
+        now = time.time()
+        with self.store.transaction() as c:
+            row = c.execute("SELECT owner, expires_at FROM leases WHERE name = 'drive_sync'").fetchone()
+            if row is None or row[0] == NODE_ID or row[1] < now:
+                c.execute("INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES ('drive_sync', ?, ?)",
+                          (NODE_ID, now + ttl))
+                return True
+        return False
+
+    def publish_events(self, events: list):
+        now = time.time()
+        with self.store.transaction() as c:
+            c.executemany(
+                "INSERT INTO events (created_at, kind, name, file_id, mtime, ctime, size, notify) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(now, kind, name, rec.id, rec.mtime, rec.ctime, rec.size, int(notify))
+                 for kind, name, rec, notify in events]
+            )
+
+    def read_events(self, after_id: int, limit: int = 1000) -> list:
+        with self.store._lock:
+            rows = self.store.conn.execute(
+                "SELECT id, kind, name, file_id, mtime, ctime, size, notify FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit)
+            ).fetchall()
+        out = []
+        for eid, kind, name, fid, mtime, ctime, size, notify in rows:
+            out.append((eid, kind, name, FileRecord(fid, mtime, ctime, size), bool(notify)))
+        return out
+
+    def last_event_id(self) -> int:
+        with self.store._lock:
+            row = self.store.conn.execute("SELECT MAX(id) FROM events").fetchone()
+        return row[0] or 0
+
+    def prune_events(self, older_than: float):
+        with self.store.transaction() as c:
+            c.execute("DELETE FROM events WHERE created_at < ?", (older_than,))
+
+    def steam_get(self, appid: str):
+        with self.store._lock:
+            row = self.store.conn.execute(
+                "SELECT expires_at, ok, value FROM steam_cache WHERE appid = ? AND expires_at >= ?", (appid, time.time())
+            ).fetchone()
+        return (row[0], bool(row[1]), json.loads(row[2])) if row else None
+
+    def steam_set(self, appid: str, expires_at: float, ok: bool, value: dict):
+        with self.store.transaction() as c:
+            c.execute("INSERT OR REPLACE INTO steam_cache (appid, expires_at, ok, value) VALUES (?, ?, ?, ?)",
+                      (appid, expires_at, int(ok), json.dumps(value)))
+
+    def get_flag(self, name: str, default):
+        raw = self.store.get_kv(f"flag:{name}")
+        return default if raw is None else json.loads(raw)
+
+    def set_flag(self, name: str, value):
+        self.store.set_kv(f"flag:{name}", json.dumps(value))
+
+def make_cluster_backend(kind: str) -> ClusterBackend:
+    if kind == "memory":
+        return MemoryClusterBackend()
+    if kind == "sqlite":
+        return SqliteClusterBackend(store)
+    raise ValueError(f"Unknown CLUSTER_BACKEND: {kind}")
+
+cluster = make_cluster_backend(CLUSTER_BACKEND)
+
+# =============== CONFIG PERSISTENCE (per-guild) ===============
 def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    return store.load_config()
 
-def save_config(cfg):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, indent=2)
+def save_guild_config(guild_id):
+    gid = str(guild_id)
+    store.save_guild(gid, config[gid])
 
 config = load_config()
 
@@ -76,78 +860,434 @@ def ensure_guild_config(guild_id: int):
             "request_channel": None,
             "request_role": None
         }
-        save_config(config)
+        save_guild_config(gid)
 
 # =============== DRIVE CACHE (anti-spam) ===============
-known_files = {}
+known_files = {}  # name -> FileRecord
 ENABLE_UPLOAD_WATCH = False
 
-# anti-spam Added
-NOTIFIED_FILE = "notified.json"
+# anti-spam Added: file_id -> notified_at. Dibuang setelah retensi → tidak tumbuh selamanya.
+NOTIFIED_RETENTION_SECONDS = float(os.getenv("NOTIFIED_RETENTION_DAYS", "30")) * 86400
+notified_files = store.load_notified(time.time() - NOTIFIED_RETENTION_SECONDS)
+_notified_pruned_at = 0.0
+
+def prune_notified():
+    """Buang entry notified yang lewat retensi (memory + store), paling sering sekali per jam."""
+    global _notified_pruned_at
+    now = time.time()
+    if now - _notified_pruned_at < 3600:
+        return
+    _notified_pruned_at = now
+    cutoff = now - NOTIFIED_RETENTION_SECONDS
+    for fid in [fid for fid, at in notified_files.items() if at < cutoff]:
+        del notified_files[fid]
+    store.prune_notified(cutoff)
+
+# =============== DRIVE SYNC (bootstrap + Changes API) ===============
+LIST_PAGE_SIZE = 1000
+FILE_FIELDS = "id,name,createdTime,modifiedTime,size"
+CHANGE_FIELDS = f"nextPageToken,newStartPageToken,changes(fileId,removed,file({FILE_FIELDS},parents,trashed))"
+
+known_ids = {}  # file id -> name (change "removed" hanya kirim fileId)
+INDEX_MAX_AGE_SECONDS = float(os.getenv("INDEX_MAX_AGE_SECONDS", "300"))
+
+def appid_from_name(name: str) -> str:
+    return name[:-4] if name.endswith(".zip") else name
+
+def _name_words(text: str) -> list:
+    return list(dict.fromkeys(re.findall(r"[0-9a-z]+", text.casefold())))
+
+def _sorted_remove(items: list, value):
+    i = bisect.bisect_left(items, value)
+    if i < len(items) and items[i] == value:
+        del items[i]
+
+class FolderIndex:
+    """Index in-memory atas known_files: appid -> nama file, plus list nama terurut untuk prefix query."""
+
+    def __init__(self):
+        self.by_appid = {}  # appid -> nama file (str), atau tuple kalau >1 file → tanpa list per appid
+        self.sorted_names = []
+        self.synced_at = 0.0
+        # autocomplete /gen: appid terurut + token nama game (kata) terurut → prefix query via bisect
+        self.sorted_appids = []
+        self.game_names = {}   # appid -> nama game (hanya appid yang ada di folder)
+        self._name_tokens = []  # (kata lowercase, appid), terurut
+        self.name_lookup = lambda appid: None  # diisi bagian Steam: nama dari cache Steam
+
+    def rebuild(self, files: dict):
+        self.by_appid = {}
+        for name in files:
+            key = appid_from_name(name)
+            prev = self.by_appid.get(key)
+            self.by_appid[key] = name if prev is None else (*self._names(prev), name)
+        self.sorted_names = sorted(files)
+        self.sorted_appids = sorted(self.by_appid)
+        names = {}
+        for appid in self.sorted_appids:
+            game = self.game_names.get(appid) or self.name_lookup(appid)
+            if game:
+                names[appid] = game
+        self.game_names = names
+        self._name_tokens = sorted((w, appid) for appid, game in names.items() for w in _name_words(game))
+
+    @staticmethod
+    def _names(value) -> tuple:
+        return (value,) if isinstance(value, str) else value
 
-def load_notified():
-    if os.path.exists(NOTIFIED_FILE):
-        with open(NOTIFIED_FILE, "r", encoding="utf-8") as f:
-            return set(json.load(f))
-    return set()
+    def add(self, name: str):
+        key = appid_from_name(name)
+        prev = self.by_appid.get(key)
+        if prev is None:
+            self.by_appid[key] = name
+            bisect.insort(self.sorted_appids, key)
+            self.set_game_name(key, self.name_lookup(key))
+        elif name in self._names(prev):
+            return
+        else:
+            self.by_appid[key] = (*self._names(prev), name)
+        bisect.insort(self.sorted_names, name)
+
+    def remove(self, name: str):
+        key = appid_from_name(name)
+        names = self._names(self.by_appid.get(key, ()))
+        if name in names:
+            rest = tuple(n for n in names if n != name)
+            if not rest:
+                del self.by_appid[key]
+                _sorted_remove(self.sorted_appids, key)
+                self._drop_game_name(key)
+            else:
+                self.by_appid[key] = rest[0] if len(rest) == 1 else rest
+            _sorted_remove(self.sorted_names, name)
+
+    def set_game_name(self, appid: str, game: Optional[str]):
+        if not game or appid not in self.by_appid or self.game_names.get(appid) == game:
+            return
+        self._drop_game_name(appid)
+        self.game_names[appid] = game
+        for w in _name_words(game):
+            bisect.insort(self._name_tokens, (w, appid))
+
+    def _drop_game_name(self, appid: str):
+        old = self.game_names.pop(appid, None)
+        if old:
+            for w in _name_words(old):
+                _sorted_remove(self._name_tokens, (w, appid))
+
+    def suggest(self, query: str, limit: int = 25, scan: int = 500) -> list:
+        """[(appid, nama game atau None)] untuk prefix appid atau prefix kata nama game."""
+        q = query.strip()
+        out, seen = [], set()
+        if not q or q.isdigit():
+            lo = bisect.bisect_left(self.sorted_appids, q)
+            for appid in self.sorted_appids[lo:lo + limit]:
+                if not appid.startswith(q):
+                    break
+                out.append((appid, self.game_names.get(appid)))
+                seen.add(appid)
+        words = _name_words(q)
+        if not words or len(out) >= limit:
+            return out
+        # kata dengan range bisect paling sempit jadi anchor, kata lain jadi filter
+        ranges = {w: (bisect.bisect_left(self._name_tokens, (w,)),
+                      bisect.bisect_left(self._name_tokens, (w + "\U0010ffff",))) for w in words}
+        anchor = min(words, key=lambda w: ranges[w][1] - ranges[w][0])
+        lo, hi = ranges[anchor]
+        for token, appid in self._name_tokens[lo:min(hi, lo + scan)]:
+            if len(out) >= limit:
+                break
+            if appid in seen:
+                continue
+            game_words = _name_words(self.game_names[appid])
+            if all(any(gw.startswith(w) for gw in game_words) for w in words):
+                out.append((appid, self.game_names[appid]))
+                seen.add(appid)
+        return out
 
-def save_notified(data):
-    with open(NOTIFIED_FILE, "w", encoding="utf-8") as f:
-        json.dump(list(data), f, indent=2)
+    def lookup(self, appid: str) -> list:
+        return list(self._names(self.by_appid.get(appid, ())))
 
-notified_files = load_notified()
+    def _prefix_range(self, prefix: str):
+        lo = bisect.bisect_left(self.sorted_names, prefix)
+        hi = bisect.bisect_left(self.sorted_names, prefix + "\U0010ffff")
+        return lo, hi
+
+    def count_prefix(self, prefix: str) -> int:
+        lo, hi = self._prefix_range(prefix)
+        return hi - lo
+
+    def prefix_names(self, prefix: str, limit: int = 25) -> list:
+        lo, hi = self._prefix_range(prefix)
+        return self.sorted_names[lo:min(hi, lo + limit)]
+
+    def mark_synced(self):
+        self.synced_at = time.monotonic()
+
+    def is_fresh(self) -> bool:
+        return self.synced_at > 0 and time.monotonic() - self.synced_at < INDEX_MAX_AGE_SECONDS
+
+folder_index = FolderIndex()
+
+async def list_folder_files():
+    """Full listing FOLDER_ID, ikut nextPageToken sampai habis."""
+    items = []
+    page_token = None
+    while True:
+        results = await drive.list_files(
+            q=f"'{FOLDER_ID}' in parents and trashed = false",
+            fields=f"nextPageToken,files({FILE_FIELDS})",
+            page_size=LIST_PAGE_SIZE,
+            page_token=page_token
+        )
+        items.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return items
 
-def initialize_known_files():
-    global known_files
+async def initialize_known_files():
+    global known_files, known_ids
     try:
-        results = drive_service.files().list(
-            q=f"'{FOLDER_ID}' in parents",
-            fields="files(id,name,createdTime,modifiedTime,size)"
-        ).execute()
-        items = results.get("files", [])
-        known_files = {
-            f["name"]: {
-                "id": f["id"],
-                "mtime": f.get("modifiedTime", ""),
-                "ctime": f.get("createdTime", ""),
-                "size": f.get("size", "0")
-            }
-            for f in items
-        }
+        # ambil token dulu, baru listing → perubahan selama listing tetap ketangkap
+        start_token = await drive.get_start_page_token()
+        items = await list_folder_files()
+        SYNC_FILES_SCANNED.inc(len(items))
+        known_files = {f["name"]: FileRecord.from_drive(f) for f in items}
+        known_ids = {f["id"]: f["name"] for f in items}
+        folder_index.rebuild(known_files)
+        folder_index.mark_synced()
+        snapshot = dict(known_files)
+
+        def persist():
+            with store.transaction():
+                store.replace_known_files(snapshot)
+                store.set_kv("page_token", start_token)
+        await asyncio.to_thread(persist)
         print(f"Initialized cache: {len(known_files)} files.")
     except Exception as e:
         print("Error initializing known_files:", e)
 
+async def load_known_files_snapshot() -> bool:
+    """Warm start: pakai snapshot known_files + page token dari store, tanpa listing ulang folder."""
+    global known_files, known_ids
+    if not store.get_kv("page_token"):
+        return False
+    snapshot = await asyncio.to_thread(store.load_known_files)
+    if not snapshot:
+        store.set_kv("page_token", None)  # token tanpa snapshot → bootstrap ulang di tick pertama
+        return False
+    known_files = snapshot
+    known_ids = {rec.id: name for name, rec in snapshot.items()}
+    folder_index.rebuild(known_files)
+    print(f"Loaded snapshot: {len(known_files)} files, resuming incremental sync.")
+    return True
+
+def _forget_file(file_id: str):
+    name = known_ids.pop(file_id, None)
+    rec = known_files.get(name) if name is not None else None
+    if rec is not None and rec.id == file_id:
+        del known_files[name]
+        folder_index.remove(name)
+    return name
+
+def _apply_change(change: dict):
+    """Terapkan satu entry changes.list ke known_files. Return (kind, name, record) atau None."""
+    fid = change.get("fileId")
+    f = change.get("file") or {}
+    in_folder = FOLDER_ID in (f.get("parents") or [])
+    if change.get("removed") or f.get("trashed") or not in_folder:
+        name = _forget_file(fid)
+        return ("removed", name, FileRecord(fid)) if name else None
+
+    fname = f["name"]
+    rec = FileRecord.from_drive(f)
+    old_name = known_ids.get(fid)
+    if old_name is not None and old_name != fname:
+        _forget_file(fid)  # rename → diperlakukan sebagai file baru
+    known_ids[fid] = fname
+
+    prev = known_files.get(fname)
+    known_files[fname] = rec
+    if prev is None:
+        folder_index.add(fname)
+        return ("added", fname, rec)
+    if prev.size != rec.size or prev.mtime != rec.mtime:
+        return ("updated", fname, rec)
+    return None  # metadata lain (permission, dll) — abaikan
+
+def apply_remote_event(kind: str, name: str, rec: FileRecord):
+    """Follower: terapkan event dari leader ke known_files/index lokal."""
+    if kind == "removed":
+        _forget_file(rec.id)
+    else:
+        old_name = known_ids.get(rec.id)
+        if old_name is not None and old_name != name:
+            _forget_file(rec.id)
+        known_ids[rec.id] = name
+        if name not in known_files:
+            folder_index.add(name)
+        known_files[name] = rec
+    if kind != "added":
+        manifest_cache.invalidate(rec.id)
+        embed_cache.invalidate_file(rec.id)
+
+async def poll_folder_changes():
+    """Ambil delta sejak page token terakhir. Cost sebanding jumlah file yang berubah, bukan ukuran folder."""
+    page_token = store.get_kv("page_token")
+    if not page_token:
+        await initialize_known_files()
+        return []
+    # Semua halaman dikumpulkan dulu; state baru diubah setelah newStartPageToken didapat.
+    # Kalau halaman berikutnya gagal, tick berikut mengulang dari token lama tanpa kehilangan event.
+    changes = []
+    while True:
+        try:
+            results = await drive.list_changes(page_token, fields=CHANGE_FIELDS, page_size=LIST_PAGE_SIZE)
+        except DriveError as e:
+            if e.status in (400, 404, 410):  # token invalid/expired → bootstrap ulang
+                print("Change token invalid, re-initializing:", e)
+                await initialize_known_files()
+                return []
+            raise
+        changes.extend(results.get("changes", []))
+        if results.get("newStartPageToken"):
+            page_token = results["newStartPageToken"]
+            break
+        page_token = results["nextPageToken"]
+
+    SYNC_FILES_SCANNED.inc(len(changes))
+    events = []
+    for change in changes:
+        ev = _apply_change(change)
+        if ev:
+            events.append(ev)
+            SYNC_EVENTS.inc(kind=ev[0])
+            if ev[0] != "added":
+                manifest_cache.invalidate(ev[2].id)
+                embed_cache.invalidate_file(ev[2].id)
+    folder_index.mark_synced()
+    # satu transaksi per tick: snapshot known_files + token
+    with store.transaction():
+        for kind, name, rec in events:
+            if kind == "removed":
+                store.delete_known_file(rec.id)
+            else:
+                store.upsert_known_file(name, rec)
+        store.set_kv("page_token", page_token)
+    return events
+
 def count_manifests_in_cache(appid: str):
-    prefix = f"{appid}"
-    return sum(1 for name in known_files.keys()
-               if name.startswith(prefix) or f"{prefix}.zip" in name)
+    return folder_index.count_prefix(f"{appid}")
+
+def lookup_appid_files(appid: str):
+    """Cari file untuk appid dari index (O(1)). Return None kalau miss / index basi → caller fallback ke Drive."""
+    if not folder_index.is_fresh():
+        return None
+    names = folder_index.lookup(appid)
+    if not names:
+        return None
+    items = [
+        drive_file_dict(n, rec)
+        for n in names if (rec := known_files.get(n))
+    ]
+    items.sort(key=lambda f: f["modifiedTime"], reverse=True)
+    return items or None
+
+# =============== TTL + LRU CACHE ===============
+class TTLCache:
+    """Cache TTL + LRU dengan negative caching dan single-flight untuk loader async."""
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()  # key -> (expires_at, ok, value)
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, key, value, ok: bool = True):
+        ttl = self.ttl if ok else self.negative_ttl
+        self._data[key] = (time.time() + ttl, ok, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def peek(self, key):
+        """Seperti get() tapi tanpa mengubah urutan LRU (untuk scan massal)."""
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry
+
+    async def get_or_load(self, key, loader):
+        """loader() -> (value, ok). Request bersamaan untuk key yang sama berbagi satu load."""
+        entry = self.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[2]
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # shield: kalau satu waiter di-cancel, load untuk waiter lain tetap jalan
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader):
+        value, ok = await loader()
+        self.set(key, value, ok)
+        return value
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {k: list(e) for k, e in self._data.items() if e[0] >= now}
+
+    def load_snapshot(self, data: dict):
+        now = time.time()
+        for k, (expires_at, ok, value) in data.items():
+            if expires_at >= now:
+                self._data[k] = (expires_at, ok, value)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def load_file(self, path: str):
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.load_snapshot(json.load(f))
+        except Exception as e:
+            print(f"Error loading cache snapshot {path}:", e)
 
 # =============== STEAM INFO HELPER ===============
-async def fetch_steam_info(appid: str):
-    """Fetch store API details (best-effort)."""
-    try:
-        async with aiohttp.ClientSession() as session:
-            url = f"https://store.steampowered.com/api/appdetails?appids={appid}"
-            async with session.get(url, timeout=15) as resp:
-                data = await resp.json()
-                entry = data.get(str(appid), {})
-                if entry.get("success"):
-                    g = entry["data"]
-                    devs = g.get("developers") or []
-                    dev = devs[0] if devs else None
-                    release_date = g.get("release_date", {}).get("date") or None
-                    return {
-                        "name": g.get("name", f"AppID {appid}"),
-                        "header": g.get("header_image"),
-                        "steam": f"https://store.steampowered.com/app/{appid}",
-                        "steamdb": f"https://steamdb.info/app/{appid}",
-                        "release_date": release_date,
-                        "developer": dev,
-                        "description": g.get("short_description", "")[:800]
-                    }
-    except Exception:
-        pass
+STEAM_STORE_BASE = os.getenv("STEAM_STORE_BASE", "https://store.steampowered.com")
+STEAM_CACHE_TTL = float(os.getenv("STEAM_CACHE_TTL", str(6 * 3600)))
+STEAM_CACHE_NEGATIVE_TTL = float(os.getenv("STEAM_CACHE_NEGATIVE_TTL", "600"))
+STEAM_CACHE_MAX_ENTRIES = int(os.getenv("STEAM_CACHE_MAX_ENTRIES", "5000"))
+STEAM_CACHE_FILE = os.getenv("STEAM_CACHE_FILE", "steam_cache.json")  # kosongkan = tanpa snapshot disk
+
+steam_cache = TTLCache(STEAM_CACHE_MAX_ENTRIES, STEAM_CACHE_TTL, STEAM_CACHE_NEGATIVE_TTL)
+steam_cache.load_file(STEAM_CACHE_FILE)
+
+def _steam_fallback(appid: str) -> dict:
     return {
         "name": f"AppID {appid}",
         "header": None,
@@ -158,43 +1298,708 @@ async def fetch_steam_info(appid: str):
         "description": ""
     }
 
+async def _load_steam_info(appid: str):
+    try:
+        session = await get_http_session()
+        url = f"{STEAM_STORE_BASE}/api/appdetails?appids={appid}"
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as resp:
+            data = await resp.json(content_type=None)
+            entry = (data or {}).get(str(appid), {})
+            if entry.get("success"):
+                g = entry["data"]
+                devs = g.get("developers") or []
+                dev = devs[0] if devs else None
+                release_date = g.get("release_date", {}).get("date") or None
+                return {
+                    "name": g.get("name", f"AppID {appid}"),
+                    "header": g.get("header_image"),
+                    "steam": f"https://store.steampowered.com/app/{appid}",
+                    "steamdb": f"https://steamdb.info/app/{appid}",
+                    "release_date": release_date,
+                    "developer": dev,
+                    "description": g.get("short_description", "")[:800]
+                }, True
+    except Exception:
+        pass
+    return _steam_fallback(appid), False
+
+async def _load_steam_info_shared(appid: str):
+    # L2: cache bersama antar proses shard (no-op di mode satu proses)
+    hit = cluster.steam_get(appid)
+    if hit is not None:
+        if hit[1]:
+            folder_index.set_game_name(appid, hit[2]["name"])
+        return hit[2], hit[1]
+    value, ok = await _load_steam_info(appid)
+    cluster.steam_set(appid, time.time() + (STEAM_CACHE_TTL if ok else STEAM_CACHE_NEGATIVE_TTL), ok, value)
+    if ok:
+        folder_index.set_game_name(appid, value["name"])
+    return value, ok
+
+def cached_game_name(appid: str) -> Optional[str]:
+    entry = steam_cache.peek(appid)
+    return entry[2]["name"] if entry and entry[1] else None
+
+folder_index.name_lookup = cached_game_name
+
+async def fetch_steam_info(appid: str):
+    """Fetch store API details (best-effort, cached per appid)."""
+    appid = str(appid).strip()
+    return await steam_cache.get_or_load(appid, lambda: _load_steam_info_shared(appid))
+
 # === Multi-CDN resolver untuk header image (pakai link langsung, bukan attachment) ===
-def resolve_header_url(appid: str, hinted_url: Optional[str]) -> Optional[str]:
+HEADER_CACHE_TTL = float(os.getenv("HEADER_CACHE_TTL", str(24 * 3600)))
+HEADER_CACHE_NEGATIVE_TTL = float(os.getenv("HEADER_CACHE_NEGATIVE_TTL", "900"))
+CDN_FAIL_THRESHOLD = 3      # gagal beruntun sebelum host di-skip
+CDN_COOLDOWN_SECONDS = 300  # lama host di-skip
+
+class CdnHealth:
+    """Statistik rolling (EWMA) sukses/latency per host CDN."""
+
+    def __init__(self, alpha: float = 0.2, fail_threshold: int = CDN_FAIL_THRESHOLD, cooldown: float = CDN_COOLDOWN_SECONDS):
+        self.alpha = alpha
+        self.fail_threshold = fail_threshold
+        self.cooldown = cooldown
+        self._stats = {}  # host -> {"ok": ewma, "latency": ewma, "fails": int, "down_until": float}
+
+    def _get(self, host: str) -> dict:
+        return self._stats.setdefault(host, {"ok": 1.0, "latency": 0.0, "fails": 0, "down_until": 0.0})
+
+    def record(self, host: str, ok: bool, latency: float):
+        st = self._get(host)
+        a = self.alpha
+        st["ok"] = (1 - a) * st["ok"] + a * (1.0 if ok else 0.0)
+        st["latency"] = latency if st["latency"] == 0.0 else (1 - a) * st["latency"] + a * latency
+        if ok:
+            st["fails"] = 0
+        else:
+            st["fails"] += 1
+            if st["fails"] >= self.fail_threshold:
+                st["down_until"] = time.monotonic() + self.cooldown
+
+    def is_down(self, host: str) -> bool:
+        return self._get(host)["down_until"] > time.monotonic()
+
+    def order(self, urls: list) -> list:
+        """Host sehat + cepat duluan, host yang lagi cooldown dibuang (kecuali semua down)."""
+        def key(u):
+            st = self._get(_url_host(u))
+            return (-st["ok"], st["latency"])
+        alive = [u for u in urls if not self.is_down(_url_host(u))]
+        return sorted(alive or urls, key=key)
+
+    def report(self) -> dict:
+        return {h: dict(st) for h, st in self._stats.items()}
+
+def _url_host(url: str) -> str:
+    return url.split("/", 3)[2] if "://" in url else url
+
+cdn_health = CdnHealth()
+header_cache = TTLCache(STEAM_CACHE_MAX_ENTRIES, HEADER_CACHE_TTL, HEADER_CACHE_NEGATIVE_TTL)
+
+HEADER_CDN_TEMPLATES = [t for t in os.getenv("HEADER_CDN_TEMPLATES", "").split(",") if t] or [
+    "https://shared.fastly.steamstatic.com/store_item_assets/steam/apps/{appid}/header.jpg",
+    "https://cdn.cloudflare.steamstatic.com/steam/apps/{appid}/header.jpg",
+    "https://cdn.akamai.steamstatic.com/steam/apps/{appid}/header.jpg",
+    "https://steamcdn-a.akamaihd.net/steam/apps/{appid}/header.jpg",
+]
+
+def _header_candidates(appid: str, hinted_url: Optional[str]) -> list:
     candidates = []
     if hinted_url:
         candidates.append(hinted_url)
-    candidates.extend([
-        f"https://shared.fastly.steamstatic.com/store_item_assets/steam/apps/{appid}/header.jpg",
-        f"https://cdn.cloudflare.steamstatic.com/steam/apps/{appid}/header.jpg",
-        f"https://cdn.akamai.steamstatic.com/steam/apps/{appid}/header.jpg",
-        f"https://steamcdn-a.akamaihd.net/steam/apps/{appid}/header.jpg",
-    ])
-    for url in candidates:
-        try:
-            resp = requests.head(url, timeout=4, allow_redirects=True)
+    candidates.extend(t.format(appid=appid) for t in HEADER_CDN_TEMPLATES)
+    return candidates
+
+async def _probe_image(session: aiohttp.ClientSession, url: str) -> Optional[str]:
+    """HEAD dulu, fallback GET (tanpa baca body). Return url kalau image valid."""
+    host = _url_host(url)
+    t0 = time.perf_counter()
+    try:
+        async with session.head(url, timeout=aiohttp.ClientTimeout(total=4), allow_redirects=True) as resp:
             ct = resp.headers.get("Content-Type", "").lower()
-            if resp.status_code == 200 and "image" in ct:
+            status = resp.status
+        if status == 200 and "image" in ct:
+            cdn_health.record(host, True, time.perf_counter() - t0)
+            return url
+        if status in (403, 404, 405) or "image" not in ct:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=6)) as r2:
+                ct = r2.headers.get("Content-Type", "").lower()
+                status = r2.status
+            if status == 200 and "image" in ct:
+                cdn_health.record(host, True, time.perf_counter() - t0)
                 return url
-            if resp.status_code in (403, 404, 405) or "image" not in ct:
-                r2 = requests.get(url, timeout=6, stream=True)
-                ct2 = r2.headers.get("Content-Type", "").lower()
-                if r2.status_code == 200 and "image" in ct2:
-                    r2.close()
-                    return url
-                r2.close()
-        except Exception:
-            continue
-    return hinted_url
+        # host menjawab (404 dll) → host sehat, cuma image-nya tidak ada
+        cdn_health.record(host, status < 500, time.perf_counter() - t0)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        cdn_health.record(host, False, time.perf_counter() - t0)
+    return None
+
+HEADER_HEDGE_DELAY = float(os.getenv("HEADER_HEDGE_DELAY", "0.25"))
+
+async def _probe_header(appid: str, hinted_url: Optional[str]):
+    """Hedged probe urut skor CDN: kandidat berikutnya baru start kalau yang di atasnya gagal
+    atau belum jawab dalam HEADER_HEDGE_DELAY. Beberapa sukses bersamaan → ambil rank tertinggi."""
+    candidates = cdn_health.order(_header_candidates(appid, hinted_url))
+    session = await get_http_session()
+    rank = {}
+    pending = set()
+    remaining = iter(candidates)
+    try:
+        while True:
+            url = next(remaining, None)
+            if url is not None:
+                task = asyncio.ensure_future(_probe_image(session, url))
+                rank[task] = len(rank)
+                pending.add(task)
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, timeout=HEADER_HEDGE_DELAY if url is not None else None,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=rank.get):
+                if task.result():
+                    return task.result(), True
+    finally:
+        for task in pending:
+            task.cancel()
+    return hinted_url, False
+
+async def resolve_header_url(appid: str, hinted_url: Optional[str]) -> Optional[str]:
+    """Probe CDN (hedged, urut skor kesehatan), ambil image valid. Hasil di-cache per appid."""
+    return await header_cache.get_or_load(str(appid), lambda: _probe_header(appid, hinted_url))
+
+# =============== EMBED PAYLOAD CACHE ===============
+# Embed /gen + info Steam/header per (appid, file_id, mtime), dirender sekali. Hit → nol call keluar.
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", str(6 * 3600)))
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "5000"))
+EMBED_PREWARM_PER_TICK = int(os.getenv("EMBED_PREWARM_PER_TICK", "200"))
+
+def gen_embed_base(appid: str, f: dict, info: dict, header_url: Optional[str]) -> dict:
+    """Embed /gen tanpa field per-request (Time, Requester); insert_at = posisi field itu nanti."""
+    created = f.get("createdTime", "")
+    modified = f.get("modifiedTime", "")
+    size_kb = int(f.get("size", 0)) // 1024
+    release_date = info.get("release_date") or created[:10] or modified[:10]
+
+    embed = discord.Embed(title="✅ Manifest Retrieved", color=discord.Color.purple())
+    embed.add_field(name="🎮 Game", value=info["name"], inline=True)
+    embed.add_field(name="🆔 AppID", value=appid, inline=True)
+    embed.add_field(name="📦 File Size", value=f"{size_kb} KB", inline=True)
+    embed.add_field(name="📅 Release Date", value=release_date, inline=True)
+    if info.get("developer"): embed.add_field(name="👨‍💼 Developer", value=info["developer"], inline=True)
+    insert_at = len(embed.fields)
+    embed.add_field(name="🔗 Links", value=f"[Steam]({info['steam']}) | [SteamDB]({info['steamdb']})", inline=False)
+    embed.add_field(name="📥 Download", value="File hanya bisa diunduh oleh requester (lihat bawah).", inline=False)
+    if info.get("description"): embed.add_field(name="ℹ️ Info", value=info["description"], inline=False)
+    if header_url: embed.set_image(url=header_url)
+    embed.set_footer(text="Generated by TechStation Manifest")
+    return {"embed": embed.to_dict(), "insert_at": insert_at}
+
+def render_gen_embed(payload: dict, elapsed: float, user) -> discord.Embed:
+    data = dict(payload["embed"])
+    data["fields"] = list(data.get("fields", []))  # from_dict tidak copy list → jangan ubah cache
+    embed = discord.Embed.from_dict(data)
+    i = payload["insert_at"]
+    embed.insert_field_at(i, name="⏱️ Time", value=f"{elapsed:.2f}s", inline=True)
+    embed.insert_field_at(i + 1, name="👤 Requester", value=user.mention, inline=True)
+    embed.timestamp = discord.utils.utcnow()
+    return embed
+
+async def _build_embed_payload(appid: str, f: dict, timed: bool):
+    with GEN_STAGE_SECONDS.time(stage="steam_fetch") if timed else nullcontext():
+        info = await fetch_steam_info(appid)
+    with GEN_STAGE_SECONDS.time(stage="header_resolve") if timed else nullcontext():
+        header_url = await resolve_header_url(appid, info.get("header"))
+    entry = steam_cache.peek(appid)
+    payload = {"info": info, "header_url": header_url, "file": f, **gen_embed_base(appid, f, info, header_url)}
+    return payload, bool(entry and entry[1])  # info fallback → TTL pendek, dicoba lagi nanti
+
+class EmbedPayloadCache:
+    """TTLCache per (appid, file_id, mtime) + index file_id → key supaya bisa di-invalidate dari event sync."""
+
+    def __init__(self, max_entries: int, ttl: float, negative_ttl: float):
+        self._cache = TTLCache(max_entries, ttl, negative_ttl)
+        self._by_file = {}  # file_id -> key terakhir
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def hits(self):
+        return self._cache.hits
+
+    @property
+    def misses(self):
+        return self._cache.misses
+
+    @staticmethod
+    def _key(appid: str, f: dict):
+        return (appid, f["id"], f.get("modifiedTime", ""))
+
+    def peek(self, appid: str, f: dict):
+        entry = self._cache.get(self._key(appid, f))
+        return entry[2] if entry is not None else None
+
+    async def get_or_build(self, appid: str, f: dict, timed: bool = False) -> dict:
+        key = self._key(appid, f)
+        old = self._by_file.get(f["id"])
+        if old is not None and old != key:
+            self._cache.invalidate(old)
+        self._by_file[f["id"]] = key
+        if len(self._by_file) > 2 * self._cache.max_entries:  # buang mapping entry yang sudah ter-evict
+            self._by_file = {k[1]: k for k in self._cache._data}
+        return await self._cache.get_or_load(key, lambda: _build_embed_payload(appid, f, timed))
+
+    def invalidate_file(self, file_id: str):
+        key = self._by_file.pop(file_id, None)
+        if key is not None:
+            self._cache.invalidate(key)
+
+embed_cache = EmbedPayloadCache(EMBED_CACHE_MAX_ENTRIES, EMBED_CACHE_TTL, STEAM_CACHE_NEGATIVE_TTL)
+
+def cached_gen_payload(appid: str) -> Optional[dict]:
+    """Payload /gen langsung dari memory (index folder + embed cache), tanpa I/O."""
+    items = lookup_appid_files(appid)
+    return embed_cache.peek(appid, items[0]) if items else None
+
+def drive_file_dict(name: str, rec: FileRecord) -> dict:
+    return {"id": rec.id, "name": name, "createdTime": rec.ctime, "modifiedTime": rec.mtime, "size": str(rec.size)}
+
+async def prewarm_embeds(events: list):
+    """Isi embed cache untuk file added/updated dari sync, supaya /gen berikutnya langsung hit."""
+    sem = asyncio.Semaphore(NOTIFY_BUILD_CONCURRENCY)
+    async def warm(name, rec):
+        async with sem:
+            try:
+                await embed_cache.get_or_build(appid_from_name(name), drive_file_dict(name, rec))
+            except Exception as e:
+                print("embed prewarm error:", e)
+    await asyncio.gather(*(warm(name, rec) for _, name, rec in events[:EMBED_PREWARM_PER_TICK]))
+
+# =============== MANIFEST FILE CACHE (memory + disk) ===============
+MANIFEST_CACHE_DIR = os.getenv("MANIFEST_CACHE_DIR", os.path.join(tempfile.gettempdir(), "manifest_cache"))
+MANIFEST_CACHE_MAX_BYTES = int(os.getenv("MANIFEST_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+MANIFEST_MEMORY_THRESHOLD_BYTES = int(os.getenv("MANIFEST_MEMORY_THRESHOLD_BYTES", str(1024 * 1024)))
+MANIFEST_MEMORY_MAX_BYTES = int(os.getenv("MANIFEST_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+class ManifestCache:
+    """Cache zip, key (file_id, modifiedTime). File kecil di memory, besar di disk.
+    Dua-duanya LRU dengan batas total size; tulis disk atomik; download single-flight."""
+
+    def __init__(self, root: str, max_bytes: int, memory_max_bytes: int, memory_threshold: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        self.memory_threshold = memory_threshold
+        self._entries = OrderedDict()  # (file_id, mtime) -> (path, size)
+        self._memory = OrderedDict()   # (file_id, mtime) -> bytes
+        self._inflight = {}
+        self.total_bytes = 0
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def _clean(mtime: str) -> str:
+        return re.sub(r"[^0-9A-Za-z]", "", mtime)
+
+    def _path(self, file_id: str, mtime: str) -> str:
+        return os.path.join(self.root, f"{file_id}__{self._clean(mtime)}.zip")
+
+    def _scan(self):
+        """Ambil entry yang sudah ada di disk (restart), urut dari yang paling lama dipakai."""
+        found = []
+        for fn in os.listdir(self.root):
+            path = os.path.join(self.root, fn)
+            if fn.endswith(".part"):
+                os.remove(path)  # sisa download yang gagal
+                continue
+            if "__" not in fn or not fn.endswith(".zip"):
+                continue
+            file_id, mtime = fn[:-4].rsplit("__", 1)
+            st = os.stat(path)
+            found.append((st.st_mtime, (file_id, mtime), path, st.st_size))
+        for _, key, path, size in sorted(found):
+            self._entries[key] = (path, size)
+            self.total_bytes += size
+        self._evict()
+
+    def _lookup(self, key):
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            return data
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry[0]):
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        os.utime(entry[0])  # urutan LRU tetap benar setelah restart (_scan pakai mtime)
+        return entry[0]
+
+    def get(self, file_id: str, mtime: str):
+        """Return bytes (memory), path (disk) atau None."""
+        return self._lookup((file_id, self._clean(mtime)))
+
+    async def fetch(self, file_id: str, mtime: str, size: int, downloader):
+        """Return bytes atau path. downloader(out) menulis isi file lengkap ke file-like `out`."""
+        key = (file_id, self._clean(mtime))
+        hit = self._lookup(key)
+        if hit is not None:
+            self.hits += 1
+            return hit
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            in_memory = 0 < size <= self.memory_threshold
+            task = asyncio.ensure_future(self._download(key, file_id, mtime, in_memory, downloader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, key, file_id: str, mtime: str, in_memory: bool, downloader):
+        if in_memory:
+            buf = io.BytesIO()
+            await downloader(buf)
+            data = buf.getvalue()
+            self._memory[key] = data
+            self.memory_bytes += len(data)
+            self._evict_memory()
+            return data
+
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                await downloader(out)
+            final = self._path(file_id, mtime)
+            os.replace(tmp, final)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        size = os.path.getsize(final)
+        self._entries[key] = (final, size)
+        self.total_bytes += size
+        self._evict(keep=key)
+        return final
+
+    def _drop(self, key):
+        path, size = self._entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep=None):
+        while self.total_bytes > self.max_bytes and self._entries:
+            key = next(iter(self._entries))
+            if key == keep:
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(key)
+                continue
+            self._drop(key)
+
+    def _evict_memory(self):
+        while self.memory_bytes > self.memory_max_bytes and len(self._memory) > 1:
+            _, data = self._memory.popitem(last=False)
+            self.memory_bytes -= len(data)
+
+    def invalidate(self, file_id: str):
+        for key in [k for k in self._memory if k[0] == file_id]:
+            self.memory_bytes -= len(self._memory.pop(key))
+        for key in [k for k in self._entries if k[0] == file_id]:
+            self._drop(key)
+
+manifest_cache = ManifestCache(MANIFEST_CACHE_DIR, MANIFEST_CACHE_MAX_BYTES,
+                               MANIFEST_MEMORY_MAX_BYTES, MANIFEST_MEMORY_THRESHOLD_BYTES)
+
+# =============== ASYNC DOWNLOADER ===============
+DOWNLOAD_MAX_CONCURRENCY = int(os.getenv("DOWNLOAD_MAX_CONCURRENCY", "4"))
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+download_slots = asyncio.Semaphore(DOWNLOAD_MAX_CONCURRENCY)
+
+async def stream_drive_file(file_id: str, out):
+    """Stream isi file Drive ke `out` (memory per chunk terbatas). Token di-refresh kalau expired/401."""
+    async with download_slots:
+        session = await get_http_session()
+        timeout = aiohttp.ClientTimeout(total=None, connect=15, sock_read=60)
+        for attempt in range(2):
+            headers = await drive.auth_headers(force_refresh=attempt > 0)
+            async with session.get(f"{DRIVE_API_BASE}/files/{file_id}", params={"alt": "media"},
+                                   headers=headers, timeout=timeout) as resp:
+                if resp.status == 401 and attempt == 0:
+                    continue
+                resp.raise_for_status()
+                async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                    out.write(chunk)
+                return
+
+async def download_manifest(file_id: str, mtime: str, size: int):
+    """Return bytes (file kecil, langsung dari memory) atau path file di cache disk."""
+    return await manifest_cache.fetch(file_id, mtime, size, lambda out: stream_drive_file(file_id, out))
+
+def manifest_discord_file(payload, file_name: str) -> discord.File:
+    if isinstance(payload, bytes):
+        return discord.File(io.BytesIO(payload), file_name)
+    return discord.File(payload, file_name)
+
+# =============== MANIFEST DOWNLOAD ENDPOINT (signed URL, ETag, Range) ===============
+# File > batas upload Discord dilayani web server sendiri: dari cache lokal, atau proxy stream dari Drive.
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")  # kosong → fallback link publik Drive
+DOWNLOAD_LINK_TTL = int(os.getenv("DOWNLOAD_LINK_TTL", "3600"))
+# Default diturunkan dari token bot → sama di semua proses cluster, tidak perlu di-share terpisah
+DOWNLOAD_SIGNING_KEY = (os.getenv("DOWNLOAD_SIGNING_KEY")
+                        or hashlib.sha256(b"manifest-download:" + (DISCORD_TOKEN or "").encode()).hexdigest()).encode()
+WEB_MAX_CONN_PER_IP = int(os.getenv("WEB_MAX_CONN_PER_IP", "2"))
+WEB_IP_BANDWIDTH_BPS = int(os.getenv("WEB_IP_BANDWIDTH_BPS", str(4 * 1024 * 1024)))  # 0 = tanpa batas
+WEB_TRUST_PROXY = os.getenv("WEB_TRUST_PROXY", "0") == "1"  # pakai X-Forwarded-For (di belakang proxy Render)
+WEB_CACHE_FILL_MAX_BYTES = int(os.getenv("WEB_CACHE_FILL_MAX_BYTES", str(MANIFEST_CACHE_MAX_BYTES // 4)))
+WEB_CHUNK_BYTES = 64 * 1024
+
+WEB_DOWNLOADS = metrics.add(Counter("manifest_http_downloads_total", "Signed-URL download requests by outcome", ("result",)))
+WEB_BYTES_SENT = metrics.add(Counter("manifest_http_bytes_sent_total", "Manifest bytes served by the web server", ("source",)))
+
+def _download_sig(file_id: str, expires: int) -> str:
+    digest = hmac.new(DOWNLOAD_SIGNING_KEY, f"{file_id}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+def signed_download_url(file_id: str, file_name: str, ttl: int = DOWNLOAD_LINK_TTL) -> str:
+    expires = int(time.time()) + ttl
+    return f"{PUBLIC_BASE_URL}/dl/{file_id}/{expires}/{_download_sig(file_id, expires)}/{quote(file_name)}"
+
+def parse_range(header: str, size: int):
+    """Satu range 'bytes=a-b' / 'a-' / '-n' → (start, end) inklusif.
+    None = abaikan header (kirim file penuh, termasuk multi-range); False = 416."""
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or m.group(1) == m.group(2) == "":
+        return None
+    first, last = m.groups()
+    if first == "":
+        n = int(last)
+        return (max(size - n, 0), size - 1) if n and size else False
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+class IpLimiter:
+    """Per IP: batas download paralel + token bucket bandwidth yang dipakai bersama semua koneksinya."""
+
+    def __init__(self, max_conn: int, rate: int):
+        self.max_conn = max_conn
+        self.rate = rate
+        self._active = {}   # ip -> jumlah download berjalan
+        self._buckets = {}  # ip -> [tokens, last_refill]
+
+    def acquire(self, ip: str) -> bool:
+        if self._active.get(ip, 0) >= self.max_conn:
+            return False
+        self._active[ip] = self._active.get(ip, 0) + 1
+        return True
+
+    def release(self, ip: str):
+        left = self._active.get(ip, 1) - 1
+        if left > 0:
+            self._active[ip] = left
+        else:  # IP idle → buang state, dict tidak tumbuh tanpa batas
+            self._active.pop(ip, None)
+            self._buckets.pop(ip, None)
+
+    async def throttle(self, ip: str, n: int):
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        bucket = self._buckets.setdefault(ip, [float(self.rate), now])
+        bucket[0] = min(float(self.rate), bucket[0] + (now - bucket[1]) * self.rate) - n
+        bucket[1] = now
+        if bucket[0] < 0:
+            await asyncio.sleep(-bucket[0] / self.rate)
+
+ip_limiter = IpLimiter(WEB_MAX_CONN_PER_IP, WEB_IP_BANDWIDTH_BPS)
+
+def client_ip(request) -> str:
+    if WEB_TRUST_PROXY:
+        fwd = request.headers.get("X-Forwarded-For", "")
+        if fwd:
+            return fwd.split(",")[0].strip()
+    return request.remote or "unknown"
+
+async def manifest_meta(file_id: str) -> Optional[dict]:
+    """Metadata dari index in-memory; Drive hanya kalau file belum dikenal. None = bukan file folder manifest."""
+    name = known_ids.get(file_id)
+    rec = known_files.get(name) if name else None
+    if rec and rec.id == file_id:
+        return {"name": name, "mtime": rec.mtime, "size": rec.size}
+    try:
+        meta = await drive.get_file(file_id, fields="id,name,modifiedTime,size,parents,trashed")
+    except DriveError as e:
+        if e.status == 404:
+            return None
+        raise
+    if FOLDER_ID not in meta.get("parents", []) or meta.get("trashed"):
+        return None
+    return {"name": meta.get("name", f"{file_id}.zip"), "mtime": meta.get("modifiedTime", ""),
+            "size": int(meta.get("size", 0))}
+
+async def _memory_chunks(payload: bytes, start: int, end: int):
+    view = memoryview(payload)
+    for i in range(start, end + 1, WEB_CHUNK_BYTES):
+        yield view[i:min(i + WEB_CHUNK_BYTES, end + 1)]
+
+async def _file_chunks(fh, start: int, end: int):
+    # fh sudah dibuka sebelum response → eviction cache (unlink) di tengah jalan tidak memutus stream
+    try:
+        fh.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = fh.read(min(WEB_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+async def _drive_chunks(file_id: str, start: int, end: int):
+    session = await get_http_session()
+    headers = await drive.auth_headers()
+    headers["Range"] = f"bytes={start}-{end}"
+    timeout = aiohttp.ClientTimeout(total=None, connect=15, sock_read=60)
+    async with session.get(f"{DRIVE_API_BASE}/files/{file_id}", params={"alt": "media"},
+                           headers=headers, timeout=timeout) as resp:
+        resp.raise_for_status()
+        skip = start if resp.status == 200 else 0  # upstream abaikan Range → potong sendiri
+        async for chunk in resp.content.iter_chunked(WEB_CHUNK_BYTES):
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk, skip = chunk[skip:], 0
+            yield chunk
+
+async def _serve_manifest(request, file_id: str, ip: str):
+    meta = await manifest_meta(file_id)
+    if meta is None:
+        WEB_DOWNLOADS.inc(result="not_found")
+        raise web.HTTPNotFound(text="File tidak ditemukan.")
+    etag = f'"{file_id}-{ManifestCache._clean(meta["mtime"])}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": f"private, max-age={DOWNLOAD_LINK_TTL}"}
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        WEB_DOWNLOADS.inc(result="not_modified")
+        return web.Response(status=304, headers=headers)
+
+    size = meta["size"]
+    source = manifest_cache.get(file_id, meta["mtime"])
+    # HEAD cukup metadata; jangan download penuh dari Drive hanya untuk isi cache
+    if source is None and request.method != "HEAD" and 0 < size <= WEB_CACHE_FILL_MAX_BYTES:
+        source = await download_manifest(file_id, meta["mtime"], size)
+    fh = None
+    if isinstance(source, bytes):
+        size = len(source)
+    elif source is not None:
+        fh = open(source, "rb")
+        size = os.fstat(fh.fileno()).st_size
+
+    rng = None
+    if "Range" in request.headers and request.headers.get("If-Range", etag) == etag:
+        rng = parse_range(request.headers["Range"], size)
+        if rng is False:
+            if fh:
+                fh.close()
+            WEB_DOWNLOADS.inc(result="bad_range")
+            raise web.HTTPRequestRangeNotSatisfiable(headers={"Content-Range": f"bytes */{size}"})
+    start, end = rng or (0, size - 1)
+
+    resp = web.StreamResponse(status=206 if rng else 200, headers=headers)
+    resp.content_type = "application/zip"
+    resp.content_length = end - start + 1 if size else 0
+    resp.headers["Content-Disposition"] = f'attachment; filename="{meta["name"]}"'
+    if rng:
+        resp.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    await resp.prepare(request)
+    if request.method == "HEAD" or not size:
+        if fh:
+            fh.close()
+        WEB_DOWNLOADS.inc(result="head" if request.method == "HEAD" else "ok")
+        return resp
+
+    if isinstance(source, bytes):
+        chunks, src = _memory_chunks(source, start, end), "memory"
+    elif fh is not None:
+        chunks, src = _file_chunks(fh, start, end), "disk"
+    else:
+        chunks, src = _drive_chunks(file_id, start, end), "drive"
+    remaining = end - start + 1
+    try:
+        async for chunk in chunks:
+            chunk = chunk[:remaining]
+            await resp.write(chunk)
+            remaining -= len(chunk)
+            WEB_BYTES_SENT.inc(len(chunk), source=src)
+            await ip_limiter.throttle(ip, len(chunk))
+            if remaining <= 0:
+                break
+        await resp.write_eof()
+        WEB_DOWNLOADS.inc(result="partial" if rng else "ok")
+    except ConnectionResetError:
+        WEB_DOWNLOADS.inc(result="client_closed")
+    except Exception:
+        # header sudah terkirim → tidak bisa ganti status; klien lihat body terpotong
+        traceback.print_exc()
+        WEB_DOWNLOADS.inc(result="error")
+    finally:
+        await chunks.aclose()
+    return resp
+
+async def download_handler(request):
+    file_id = request.match_info["file_id"]
+    try:
+        expires = int(request.match_info["expires"])
+    except ValueError:
+        expires = 0
+    # bandingkan bytes: compare_digest(str, str) TypeError kalau sig berisi karakter non-ASCII
+    if not hmac.compare_digest(_download_sig(file_id, expires).encode(), request.match_info["sig"].encode()):
+        WEB_DOWNLOADS.inc(result="forbidden")
+        raise web.HTTPForbidden(text="Link tidak valid.")
+    if expires < time.time():
+        WEB_DOWNLOADS.inc(result="expired")
+        raise web.HTTPGone(text="Link sudah kedaluwarsa, jalankan /gen lagi.")
+
+    ip = client_ip(request)
+    if not ip_limiter.acquire(ip):
+        WEB_DOWNLOADS.inc(result="throttled")
+        raise web.HTTPTooManyRequests(text="Terlalu banyak download paralel.", headers={"Retry-After": "5"})
+    try:
+        return await _serve_manifest(request, file_id, ip)
+    finally:
+        ip_limiter.release(ip)
+
+web_app.router.add_get("/dl/{file_id}/{expires}/{sig}/{name}", download_handler)
 
 # =============== /gen COMMAND (non-owner allowed) ===============
 DISCORD_UPLOAD_LIMIT_BYTES = 8 * 1024 * 1024  # ~8MB (server non-boost)
 
-def ensure_public_link(file_id: str):
+async def ensure_public_link(file_id: str):
     """Pastikan file bisa diakses via link publik. Return (webContentLink, webViewLink)."""
     try:
-        meta = drive_service.files().get(
-            fileId=file_id, fields="webContentLink, webViewLink, permissions"
-        ).execute()
+        meta = await drive.get_file(file_id, fields="webContentLink, webViewLink, permissions")
         web_content = meta.get("webContentLink")
         web_view = meta.get("webViewLink")
 
@@ -202,13 +2007,8 @@ def ensure_public_link(file_id: str):
         is_public = any(p.get("type") == "anyone" for p in perms)
         if not is_public:
             try:
-                drive_service.permissions().create(
-                    fileId=file_id,
-                    body={"type": "anyone", "role": "reader"},
-                ).execute()
-                meta = drive_service.files().get(
-                    fileId=file_id, fields="webContentLink, webViewLink"
-                ).execute()
+                await drive.create_permission(file_id, {"type": "anyone", "role": "reader"})
+                meta = await drive.get_file(file_id, fields="webContentLink, webViewLink")
                 web_content = meta.get("webContentLink")
                 web_view = meta.get("webViewLink")
             except Exception:
@@ -217,6 +2017,180 @@ def ensure_public_link(file_id: str):
     except Exception:
         return None, None
 
+async def post_request_channel(guild_id, embed: discord.Embed):
+    """Kirim embed request (Not Found) ke request channel guild, mention role kalau diset."""
+    conf = config.get(str(guild_id), {})
+    req_ch = conf.get("request_channel")
+    req_role = conf.get("request_role")
+    if req_ch:
+        ch = bot.get_channel(req_ch)
+        if ch:
+            mention_txt = f"<@&{req_role}>" if req_role else None
+            if mention_txt:
+                await ch.send(content=mention_txt, embed=embed)
+            else:
+                await ch.send(embed=embed)
+
+def drive_link_text(dl_link, view_link, file_id: str) -> str:
+    return dl_link or view_link or f"https://drive.google.com/file/d/{file_id}/view"
+
+async def manifest_link(file_id: str, file_name: str) -> str:
+    """Link untuk file yang tidak di-upload ke Discord: signed URL web server kalau PUBLIC_BASE_URL diset."""
+    if PUBLIC_BASE_URL:
+        return signed_download_url(file_id, file_name)
+    return drive_link_text(*await ensure_public_link(file_id), file_id)
+
+async def resolve_gen(appid: str) -> dict:
+    """Kerja berat /gen untuk satu appid (lookup, Steam, header, download). Hasil dipakai bersama."""
+    # Index in-memory dulu, Drive hanya kalau miss / index basi
+    with GEN_STAGE_SECONDS.time(stage="drive_lookup"):
+        items = lookup_appid_files(appid)
+        if items is None:
+            found = await drive_find_appids([appid])
+            items = [found[appid]] if appid in found else []
+
+    if not items:
+        with GEN_STAGE_SECONDS.time(stage="steam_fetch"):
+            info = await fetch_steam_info(appid)
+        with GEN_STAGE_SECONDS.time(stage="header_resolve"):
+            header_url = await resolve_header_url(appid, info.get("header"))
+        return {"found": False, "info": info, "header_url": header_url}
+
+    # Ditemukan file → Steam/header/embed dari embed cache (build sekali per versi file)
+    f = items[0]
+    file_id = f["id"]
+    size_bytes = int(f.get("size", 0))
+    embed_payload = await embed_cache.get_or_build(appid, f, timed=True)
+    res = {"found": True, "info": embed_payload["info"], "header_url": embed_payload["header_url"], "file": f,
+           "embed": embed_payload, "payload": None, "link": None, "download_error": None}
+
+    # Jika file terlalu besar → link download (signed URL web server / Drive)
+    if size_bytes > DISCORD_UPLOAD_LIMIT_BYTES:
+        res["link"] = await manifest_link(file_id, f["name"])
+        return res
+
+    # Ambil dari cache (memory/disk), download dari Drive kalau belum ada
+    try:
+        with GEN_STAGE_SECONDS.time(stage="download"):
+            res["payload"] = await download_manifest(file_id, f.get("modifiedTime", ""), size_bytes)
+    except Exception as dl_err:
+        traceback.print_exc()
+        res["download_error"] = str(dl_err)
+        res["link"] = await manifest_link(file_id, f["name"])
+    return res
+
+# =============== /gen SCHEDULER ===============
+GEN_WORKERS = int(os.getenv("GEN_WORKERS", "4"))
+GEN_MAX_QUEUE = int(os.getenv("GEN_MAX_QUEUE", "50"))
+GEN_MAX_PER_USER = int(os.getenv("GEN_MAX_PER_USER", "3"))
+GEN_MAX_WAIT_SECONDS = float(os.getenv("GEN_MAX_WAIT_SECONDS", "600"))  # token interaction berlaku 15 menit
+
+class GenQueueFull(Exception):
+    def __init__(self, queued: int, reason: str):
+        super().__init__(reason)
+        self.queued = queued
+
+class GenScheduler:
+    """Worker pool ukuran tetap untuk /gen. Antrian adil: round-robin antar guild, lalu antar user.
+    Request appid yang sama (antri / sedang jalan) berbagi satu hasil."""
+
+    def __init__(self, resolver, workers: int, max_queue: int, max_per_user: int):
+        self.resolver = resolver
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._guilds = OrderedDict()  # guild_key -> OrderedDict(user_id -> deque[(appid, future)])
+        self._inflight = {}           # appid -> future
+        self._per_user = {}           # user_id -> jumlah job antri
+        self.queued = 0
+        self.busy = 0                 # worker yang sedang mengerjakan job
+        self._wakeup = None
+        self._tasks = []
+        self.coalesced = 0
+        self.shed = 0
+
+    def _ensure_workers(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, appid: str, guild_id, user_id: int, run=None):
+        """Return (future, posisi_antrian). posisi 0 = langsung dikerjakan / gabung job yang sedang jalan.
+        run: coroutine function pengganti resolver (mis. /genbatch); appid jadi key coalescing-nya."""
+        self._ensure_workers()
+        fut = self._inflight.get(appid)
+        if fut is not None:
+            self.coalesced += 1
+            return fut, self._position(fut)
+        if self.queued >= self.max_queue:
+            self.shed += 1
+            raise GenQueueFull(self.queued, "queue full")
+        if self._per_user.get(user_id, 0) >= self.max_per_user:
+            self.shed += 1
+            raise GenQueueFull(self.queued, "per-user limit")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[appid] = fut
+        users = self._guilds.setdefault(guild_id or 0, OrderedDict())
+        users.setdefault(user_id, deque()).append((appid, fut, user_id, run))
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self.queued += 1
+        self._wakeup.set()
+        return fut, self._position(fut)
+
+    def _position(self, fut) -> int:
+        """Posisi job dalam urutan ambil round-robin (simulasi _next_job tanpa mengubah antrian),
+        dikurangi worker yang masih bebas. 0 = sudah jalan / langsung diambil worker."""
+        guilds = deque(deque(deque(jobs) for jobs in users.values()) for users in self._guilds.values())
+        pos = 0
+        while guilds:
+            users = guilds.popleft()
+            jobs = users.popleft()
+            pos += 1
+            if jobs.popleft()[1] is fut:
+                return max(pos - (self.workers - self.busy), 0)
+            if jobs:
+                users.append(jobs)
+            if users:
+                guilds.append(users)
+        return 0
+
+    def _next_job(self):
+        guild_key, users = next(iter(self._guilds.items()))
+        user_id, jobs = next(iter(users.items()))
+        job = jobs.popleft()
+        # giliran user & guild ini pindah ke belakang
+        users.move_to_end(user_id)
+        if not jobs:
+            del users[user_id]
+        self._guilds.move_to_end(guild_key)
+        if not users:
+            del self._guilds[guild_key]
+        self.queued -= 1
+        self._per_user[job[2]] -= 1
+        if not self._per_user[job[2]]:
+            del self._per_user[job[2]]
+        return job
+
+    async def _worker(self):
+        while True:
+            while not self.queued:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            appid, fut, _, run = self._next_job()
+            self.busy += 1
+            try:
+                fut.set_result(await (run() if run is not None else self.resolver(appid)))
+            except Exception as e:
+                fut.set_exception(e)
+                fut.exception()  # tandai sudah diambil kalau tidak ada waiter
+            finally:
+                self.busy -= 1
+                self._inflight.pop(appid, None)
+
+gen_scheduler = GenScheduler(resolve_gen, GEN_WORKERS, GEN_MAX_QUEUE, GEN_MAX_PER_USER)
+
 @tree.command(name="gen", description="Ambil manifest (.zip) dari Google Drive via AppID")
 async def gen(interaction: discord.Interaction, appid: str):
     if interaction.guild_id:
@@ -226,15 +2200,36 @@ async def gen(interaction: discord.Interaction, appid: str):
     start_t = time.perf_counter()
 
     try:
-        # List di Drive
-        q = f"name contains '{appid}.zip' and '{FOLDER_ID}' in parents"
-        results = drive_service.files().list(
-            q=q, fields="files(id,name,createdTime,modifiedTime,size)"
-        ).execute()
-        items = results.get("files", [])
-
-        if not items:
-            info = await fetch_steam_info(appid)
+        appid = appid.strip()
+        # Embed sudah dirender (file dikenal index) → kirim dulu, download menyusul lewat scheduler
+        early = cached_gen_payload(appid)
+        if early is not None:
+            await interaction.followup.send(
+                embed=render_gen_embed(early, time.perf_counter() - start_t, interaction.user), ephemeral=False
+            )
+        try:
+            fut, position = gen_scheduler.submit(appid, interaction.guild_id, interaction.user.id)
+        except GenQueueFull as full:
+            GEN_REQUESTS.inc(result="shed")
+            await interaction.followup.send(
+                f"🚦 Bot sedang sibuk ({full.queued} request di antrian). Coba lagi sebentar lagi.",
+                ephemeral=True
+            )
+            return
+        if position > 0:
+            await interaction.followup.send(f"⏳ Request kamu masuk antrian (posisi #{position}).", ephemeral=True)
+        # timeout hanya untuk menunggu antrian; error job (termasuk timeout Drive) lewat cabang error biasa
+        done, _ = await asyncio.wait({fut}, timeout=GEN_MAX_WAIT_SECONDS)
+        if not done:
+            GEN_REQUESTS.inc(result="timeout")
+            await interaction.followup.send("⌛ Antrian /gen terlalu lama, silakan coba lagi.", ephemeral=True)
+            return
+        res = fut.result()
+        info = res["info"]
+        header_url = res["header_url"]
+
+        GEN_REQUESTS.inc(result="found" if res["found"] else "not_found")
+        if not res["found"]:
             embed_nf = discord.Embed(
                 title="🚨 Game Requested (Not Found)",
                 description=f"User {interaction.user.mention} request AppID **{appid}**",
@@ -244,179 +2239,523 @@ async def gen(interaction: discord.Interaction, appid: str):
             embed_nf.add_field(name="📊 SteamDB", value=f"[Open]({info['steamdb']})", inline=True)
             if info.get("developer"): embed_nf.add_field(name="👨‍💼 Developer", value=info["developer"], inline=True)
             if info.get("release_date"): embed_nf.add_field(name="📅 Release Date", value=info["release_date"], inline=True)
-            header_url = resolve_header_url(appid, info.get("header"))
             if header_url: embed_nf.set_image(url=header_url)
             embed_nf.timestamp = discord.utils.utcnow()
             embed_nf.set_footer(text="Requested via /gen")
 
             await interaction.followup.send(embed=embed_nf, ephemeral=False)
 
-            conf = config.get(str(interaction.guild_id), {})
-            req_ch = conf.get("request_channel")
-            req_role = conf.get("request_role")
-            if req_ch:
-                ch = bot.get_channel(req_ch)
-                if ch:
-                    mention_txt = f"<@&{req_role}>" if req_role else None
-                    if mention_txt:
-                        await ch.send(content=mention_txt, embed=embed_nf)
-                    else:
-                        await ch.send(embed=embed_nf)
+            await post_request_channel(interaction.guild_id, embed_nf)
             return
 
-        # Ditemukan file
-        f = items[0]
-        file_id, file_name = f["id"], f["name"]
-        created = f.get("createdTime", "")
-        modified = f.get("modifiedTime", "")
+        f = res["file"]
+        file_name = f["name"]
         size_bytes = int(f.get("size", 0))
-        size_kb = size_bytes // 1024
-
-        info = await fetch_steam_info(appid)
-        elapsed = time.perf_counter() - start_t
-        release_date = info.get("release_date") or created[:10] or modified[:10]
-
-        embed = discord.Embed(title="✅ Manifest Retrieved", color=discord.Color.purple())
-        embed.add_field(name="🎮 Game", value=info["name"], inline=True)
-        embed.add_field(name="🆔 AppID", value=appid, inline=True)
-        embed.add_field(name="📦 File Size", value=f"{size_kb} KB", inline=True)
-        embed.add_field(name="📅 Release Date", value=release_date, inline=True)
-        if info.get("developer"): embed.add_field(name="👨‍💼 Developer", value=info["developer"], inline=True)
-        embed.add_field(name="⏱️ Time", value=f"{elapsed:.2f}s", inline=True)
-        embed.add_field(name="👤 Requester", value=interaction.user.mention, inline=True)
-        embed.add_field(name="🔗 Links", value=f"[Steam]({info['steam']}) | [SteamDB]({info['steamdb']})", inline=False)
-        embed.add_field(name="📥 Download", value="File hanya bisa diunduh oleh requester (lihat bawah).", inline=False)
-        if info.get("description"): embed.add_field(name="ℹ️ Info", value=info["description"], inline=False)
-        header_url = resolve_header_url(appid, info.get("header"))
-        if header_url: embed.set_image(url=header_url)
-        embed.timestamp = discord.utils.utcnow()
-        embed.set_footer(text="Generated by TechStation Manifest")
 
-        await interaction.followup.send(embed=embed, ephemeral=False)
+        if early is None:
+            embed = render_gen_embed(res["embed"], time.perf_counter() - start_t, interaction.user)
+            await interaction.followup.send(embed=embed, ephemeral=False)
 
-        # Jika file terlalu besar → langsung link Drive
+        # Jika file terlalu besar → link download (signed URL web server / Drive)
         if size_bytes > DISCORD_UPLOAD_LIMIT_BYTES:
-            dl_link, view_link = ensure_public_link(file_id)
-            link_text = dl_link or view_link or f"https://drive.google.com/file/d/{file_id}/view"
             await interaction.followup.send(
-                content=f"⚠️ File terlalu besar untuk diupload ke Discord.\n🔗 **Download:** {link_text}",
+                content=f"⚠️ File terlalu besar untuk diupload ke Discord.\n🔗 **Download:** {res['link']}",
+                ephemeral=True
+            )
+            return
+
+        if res["download_error"]:
+            await interaction.followup.send(
+                content=f"⚠️ Gagal mengunduh file dari Drive (akan dikirim link langsung).\n🔗 **Download:** {res['link']}\n📝 Detail: `{res['download_error']}`",
                 ephemeral=True
             )
             return
 
-        # Download streaming dengan timeout aman
-        tmp_path = f"/tmp/{file_name}"
+        with GEN_STAGE_SECONDS.time(stage="discord_upload"):
+            await interaction.followup.send(
+                content="📥 File manifest siap diunduh:",
+                file=manifest_discord_file(res["payload"], file_name),
+                ephemeral=True
+            )
+
+    except Exception as e:
+        GEN_REQUESTS.inc(result="error")
+        traceback.print_exc()
         try:
-            with requests.get(
-                f"https://www.googleapis.com/drive/v3/files/{file_id}?alt=media",
-                headers={"Authorization": f"Bearer {creds.token}"},
-                stream=True,
-                timeout=(15, 60),  # (connect, read)
-            ) as r:
-                r.raise_for_status()
-                with open(tmp_path, "wb") as out_f:
-                    for chunk in r.iter_content(chunk_size=1 << 14):
-                        if chunk:
-                            out_f.write(chunk)
-        except Exception as dl_err:
+            await interaction.followup.send(f"⚠️ Error saat menjalankan /gen: {str(e) or type(e).__name__}", ephemeral=True)
+        except Exception:
+            pass
+
+@gen.autocomplete("appid")
+async def gen_appid_autocomplete(interaction: discord.Interaction, current: str):
+    """Saran appid dari index folder (prefix appid atau kata nama game) → user tidak menebak ID."""
+    return [app_commands.Choice(name=(f"{game} ({appid})" if game else appid)[:100], value=appid)
+            for appid, game in folder_index.suggest(current)]
+
+# =============== /genbatch COMMAND (non-owner allowed) ===============
+BATCH_MAX_APPIDS = int(os.getenv("BATCH_MAX_APPIDS", "25"))
+BATCH_QUERY_CHUNK = 10  # appid per query OR di Drive (batas panjang q)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))  # Steam fetch / download paralel per batch
+
+def parse_appid_list(text: str) -> list:
+    seen = OrderedDict()
+    for a in re.findall(r"\d+", text):
+        seen.setdefault(a, None)
+    return list(seen)
+
+async def drive_find_appids(appids: list) -> dict:
+    """appid -> file Drive terbaru, langsung query Drive (satu query OR per chunk). Dipakai kalau index miss."""
+    async def query(chunk):
+        terms = " or ".join(f"name contains '{a}.zip'" for a in chunk)
+        files = []
+        page_token = None
+        while True:
+            results = await drive.list_files(
+                q=f"({terms}) and '{FOLDER_ID}' in parents and trashed = false",
+                fields="nextPageToken, files(id,name,createdTime,modifiedTime,size)",
+                page_size=LIST_PAGE_SIZE,
+                page_token=page_token
+            )
+            files.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                return chunk, files
+
+    found = {}
+    chunks = [appids[i:i + BATCH_QUERY_CHUNK] for i in range(0, len(appids), BATCH_QUERY_CHUNK)]
+    for chunk, files in await asyncio.gather(*(query(c) for c in chunks)):
+        for appid in chunk:
+            # "contains" juga cocok ke 730.zip untuk appid 30 → harus sama persis
+            matches = [f for f in files if appid_from_name(f["name"]) == appid]
+            if matches:
+                found[appid] = max(matches, key=lambda f: f.get("modifiedTime", ""))
+    return found
+
+async def resolve_batch_files(appids: list) -> dict:
+    """appid -> file Drive terbaru. Index dulu; sisanya lewat drive_find_appids."""
+    found = {}
+    misses = []
+    for appid in appids:
+        items = lookup_appid_files(appid)
+        if items:
+            found[appid] = items[0]
+        else:
+            misses.append(appid)
+    if misses:
+        found.update(await drive_find_appids(misses))
+    return found
+
+def build_zip_bundle(entries: list) -> bytes:
+    """entries: [(arcname, bytes|path)]. Zip sudah terkompresi → ZIP_STORED."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        for arcname, payload in entries:
+            if isinstance(payload, bytes):
+                zf.writestr(arcname, payload)
+            else:
+                with open(payload, "rb") as src, zf.open(arcname, "w") as dst:
+                    while chunk := src.read(DOWNLOAD_CHUNK_BYTES):
+                        dst.write(chunk)
+    return buf.getvalue()
+
+async def resolve_batch(wanted: list) -> dict:
+    """Kerja berat /genbatch (lookup, Steam, download, link). Paralel dibatasi BATCH_CONCURRENCY."""
+    sem = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def bounded(coro):
+        async with sem:
+            return await coro
+
+    with GENBATCH_STAGE_SECONDS.time(stage="drive_lookup"):
+        found = await resolve_batch_files(wanted)
+    missing = [a for a in wanted if a not in found]
+    with GENBATCH_STAGE_SECONDS.time(stage="steam_fetch"):
+        infos = dict(zip(wanted, await asyncio.gather(*(bounded(fetch_steam_info(a)) for a in wanted))))
+
+    # Pilih file yang muat di attachment; sisanya dikirim sebagai link Drive
+    bundled, linked, budget = [], [], DISCORD_UPLOAD_LIMIT_BYTES
+    for appid in wanted:
+        if appid not in found:
+            continue
+        cost = int(found[appid].get("size", 0)) + 512  # + header zip per entry
+        if cost <= budget:
+            bundled.append(appid)
+            budget -= cost
+        else:
+            linked.append(appid)
+
+    async def fetch(appid):
+        f = found[appid]
+        try:
+            return await bounded(download_manifest(f["id"], f.get("modifiedTime", ""), int(f.get("size", 0))))
+        except Exception:
             traceback.print_exc()
-            dl_link, view_link = ensure_public_link(file_id)
-            link_text = dl_link or view_link or f"https://drive.google.com/file/d/{file_id}/view"
+            return None
+
+    with GENBATCH_STAGE_SECONDS.time(stage="download"):
+        payloads = await asyncio.gather(*(fetch(a) for a in bundled))
+    entries = []
+    for appid, payload in zip(bundled, payloads):
+        if payload is None:
+            linked.append(appid)  # gagal download → fallback link
+        else:
+            entries.append((found[appid]["name"], payload))
+
+    links = {}
+    if linked:
+        results = await asyncio.gather(*(bounded(manifest_link(found[a]["id"], found[a]["name"])) for a in linked))
+        links = dict(zip(linked, results))
+    return {"found": found, "missing": missing, "infos": infos, "entries": entries, "links": links}
+
+@tree.command(name="genbatch", description="Ambil banyak manifest sekaligus (AppID dipisah spasi/koma) dalam satu zip")
+async def genbatch(interaction: discord.Interaction, appids: str):
+    if interaction.guild_id:
+        ensure_guild_config(interaction.guild_id)
+
+    await interaction.response.defer(ephemeral=False)
+    start_t = time.perf_counter()
+
+    try:
+        wanted = parse_appid_list(appids)
+        if not wanted:
+            await interaction.followup.send("Masukkan minimal satu AppID, contoh: `/genbatch 730 570 440`", ephemeral=True)
+            return
+        if len(wanted) > BATCH_MAX_APPIDS:
+            await interaction.followup.send(f"⚠️ Maksimal {BATCH_MAX_APPIDS} AppID per batch.", ephemeral=True)
+            return
+        GEN_REQUESTS.inc(result="batch")
+
+        # Satu batch = satu job di gen_scheduler → kena batas per-user, fairness & shedding yang sama
+        try:
+            fut, position = gen_scheduler.submit(f"batch:{','.join(wanted)}", interaction.guild_id,
+                                                 interaction.user.id, run=lambda: resolve_batch(wanted))
+        except GenQueueFull as full:
+            GEN_REQUESTS.inc(result="shed")
             await interaction.followup.send(
-                content=f"⚠️ Gagal mengunduh file dari Drive (akan dikirim link langsung).\n🔗 **Download:** {link_text}\n📝 Detail: `{dl_err}`",
+                f"🚦 Bot sedang sibuk ({full.queued} request di antrian). Coba lagi sebentar lagi.",
                 ephemeral=True
             )
             return
+        if position > 0:
+            await interaction.followup.send(f"⏳ Batch kamu masuk antrian (posisi #{position}).", ephemeral=True)
+        # timeout hanya untuk menunggu antrian; error job (termasuk timeout Drive) lewat cabang error biasa
+        done, _ = await asyncio.wait({fut}, timeout=GEN_MAX_WAIT_SECONDS)
+        if not done:
+            GEN_REQUESTS.inc(result="timeout")
+            await interaction.followup.send("⌛ Antrian /genbatch terlalu lama, silakan coba lagi.", ephemeral=True)
+            return
+        res = fut.result()
+        found, missing, infos = res["found"], res["missing"], res["infos"]
+        entries, links = res["entries"], res["links"]
 
-        await interaction.followup.send(
-            content="📥 File manifest siap diunduh:",
-            file=discord.File(tmp_path, file_name),
-            ephemeral=True
-        )
+        elapsed = time.perf_counter() - start_t
+        embed = discord.Embed(title="📦 Batch Manifest Retrieved", color=discord.Color.purple())
+        embed.add_field(name="✅ Ditemukan", value=str(len(found)), inline=True)
+        embed.add_field(name="❌ Tidak ada", value=str(len(missing)), inline=True)
+        embed.add_field(name="⏱️ Time", value=f"{elapsed:.2f}s", inline=True)
+        embed.add_field(name="👤 Requester", value=interaction.user.mention, inline=True)
+        if found:
+            lines = [f"`{a}` {infos[a]['name']}" for a in wanted if a in found]
+            embed.add_field(name="🎮 Game", value="\n".join(lines)[:1024], inline=False)
+        if missing:
+            embed.add_field(name="🚨 Not Found", value=", ".join(f"`{a}`" for a in missing)[:1024], inline=False)
+        embed.timestamp = discord.utils.utcnow()
+        embed.set_footer(text="Generated by TechStation Manifest")
+        await interaction.followup.send(embed=embed, ephemeral=False)
+
+        if entries:
+            bundle = await asyncio.to_thread(build_zip_bundle, entries)
+            with GENBATCH_STAGE_SECONDS.time(stage="discord_upload"):
+                await interaction.followup.send(
+                    content=f"📥 {len(entries)} file manifest dalam satu zip:",
+                    file=discord.File(io.BytesIO(bundle), f"manifests_{len(entries)}.zip"),
+                    ephemeral=True
+                )
+        if links:
+            text = "\n".join(f"`{a}` → {url}" for a, url in links.items())
+            await interaction.followup.send(
+                content=f"⚠️ File berikut terlalu besar / gagal diunduh, pakai link langsung:\n{text}"[:2000],
+                ephemeral=True
+            )
+
+        # Satu post gabungan ke request channel, bukan N embed Not Found
+        if missing:
+            embed_nf = discord.Embed(
+                title=f"🚨 {len(missing)} Game Requested (Not Found)",
+                description=f"User {interaction.user.mention} request via /genbatch:\n" + "\n".join(
+                    f"**{infos[a]['name']}** (`{a}`) — [Steam]({infos[a]['steam']}) | [SteamDB]({infos[a]['steamdb']})"
+                    for a in missing
+                )[:3900],
+                color=discord.Color.red()
+            )
+            embed_nf.timestamp = discord.utils.utcnow()
+            embed_nf.set_footer(text="Requested via /genbatch")
+            await post_request_channel(interaction.guild_id, embed_nf)
 
     except Exception as e:
+        GEN_REQUESTS.inc(result="error")
         traceback.print_exc()
         try:
-            await interaction.followup.send(f"⚠️ Error saat menjalankan /gen: {e}", ephemeral=True)
+            await interaction.followup.send(f"⚠️ Error saat menjalankan /genbatch: {str(e) or type(e).__name__}", ephemeral=True)
         except Exception:
             pass
 
+# =============== NOTIFICATION DISPATCHER ===============
+NOTIFY_MAX_CONCURRENCY = int(os.getenv("NOTIFY_MAX_CONCURRENCY", "10"))
+NOTIFY_COALESCE_THRESHOLD = int(os.getenv("NOTIFY_COALESCE_THRESHOLD", "5"))
+NOTIFY_BUILD_CONCURRENCY = 8
+
+class NotificationDispatcher:
+    """Antrian per channel selama satu tick. Flush: channel paralel (dibatasi semaphore),
+    di dalam satu channel tetap urut supaya cocok dengan rate-limit bucket per channel discord.py."""
+
+    def __init__(self, max_concurrency: int, coalesce_threshold: int):
+        self.coalesce_threshold = coalesce_threshold
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._queues = {}  # channel_id -> [(kind, embed, summary_line)]
+
+    def add(self, channel_id: int, kind: str, embed: discord.Embed, summary_line: str):
+        self._queues.setdefault(channel_id, []).append((kind, embed, summary_line))
+
+    async def flush(self):
+        queues, self._queues = self._queues, {}
+        await asyncio.gather(*(self._deliver(ch_id, items) for ch_id, items in queues.items()))
+
+    def _summary_embeds(self, items: list) -> list:
+        added = [line for kind, _, line in items if kind == "added"]
+        updated = [line for kind, _, line in items if kind == "updated"]
+        embeds = []
+        for title, lines, color in (
+            (f"🆕 {len(added)} Game Added", added, discord.Color.blue()),
+            (f"♻️ {len(updated)} Game Updated", updated, discord.Color.orange()),
+        ):
+            chunk = []
+            for line in lines:
+                if sum(len(x) + 1 for x in chunk) + len(line) > 4000:
+                    embeds.append(discord.Embed(title=title, description="\n".join(chunk), color=color))
+                    chunk = []
+                chunk.append(line)
+            if chunk:
+                embeds.append(discord.Embed(title=title, description="\n".join(chunk), color=color))
+        for e in embeds:
+            e.timestamp = discord.utils.utcnow()
+            e.set_footer(text="Reported by TechStation Manifest")
+        return embeds
+
+    async def _deliver(self, channel_id: int, items: list):
+        ch = bot.get_channel(channel_id)
+        if not ch:
+            return
+        if len(items) > self.coalesce_threshold:
+            embeds = self._summary_embeds(items)  # burst → ringkasan, bukan N pesan
+        else:
+            embeds = [embed for _, embed, _ in items]
+        for embed in embeds:
+            async with self._sem:
+                try:
+                    await ch.send(embed=embed)
+                except discord.HTTPException as e:
+                    print(f"notify channel {channel_id} error:", e)
+
+notifier = NotificationDispatcher(NOTIFY_MAX_CONCURRENCY, NOTIFY_COALESCE_THRESHOLD)
+
+async def build_file_embed(kind: str, fname: str, rec: FileRecord):
+    """Return (embed lengkap, baris ringkas untuk summary burst)."""
+    appid = appid_from_name(fname)
+    payload = await embed_cache.get_or_build(appid, drive_file_dict(fname, rec))
+    info = payload["info"]
+    total_files = count_manifests_in_cache(appid)
+    if kind == "added":
+        embed = discord.Embed(
+            title=f"🆕 New Game Added — {info['name']} ({appid})",
+            description=f"**{info['name']}** (`{appid}`) ditambahkan ke drive.",
+            color=discord.Color.blue()
+        )
+    else:
+        embed = discord.Embed(
+            title=f"♻️ Game Updated — {info['name']} ({appid})",
+            description=f"**{info['name']}** (`{appid}`) diperbarui (file size berubah).",
+            color=discord.Color.orange()
+        )
+    if info.get("developer"): embed.add_field(name="👨‍💼 Developer", value=info["developer"], inline=True)
+    if info.get("release_date"): embed.add_field(name="📅 Release Date", value=info["release_date"], inline=True)
+    embed.add_field(name="📦 Manifest Files", value=str(total_files), inline=True)
+    embed.add_field(name="📅 Upload Date", value=rec.ctime[:10], inline=True)
+    if kind == "updated":
+        embed.add_field(name="🔁 Update Date", value=rec.mtime[:10], inline=True)
+        embed.add_field(name="📦 New Size", value=f"{rec.size // 1024} KB", inline=True)
+    embed.add_field(name="🔗 Links", value=f"[Steam]({info['steam']}) | [SteamDB]({info['steamdb']})", inline=False)
+    if payload["header_url"]: embed.set_image(url=payload["header_url"])
+    embed.timestamp = discord.utils.utcnow()
+    embed.set_footer(text="Reported by TechStation Manifest")
+    return embed, f"**{info['name']}** (`{appid}`)"
+
 # =============== BACKGROUND MONITOR ===============
 @tasks.loop(minutes=1)
 async def check_new_files():
-    global known_files, ENABLE_UPLOAD_WATCH, notified_files
-    if not ENABLE_UPLOAD_WATCH:
-        return
+    with SYNC_TICK_SECONDS.time():
+        await _check_new_files_tick()
+
+_event_cursor = 0
+_was_leader = False
+_prewarm_task = None  # prewarm embed yang masih jalan; tick berikutnya tidak menumpuk task baru
+
+async def _check_new_files_tick():
+    global known_files, ENABLE_UPLOAD_WATCH, notified_files, _event_cursor, _was_leader, _prewarm_task
     try:
-        results = drive_service.files().list(q=f"'{FOLDER_ID}' in parents", fields="files(id,name,createdTime,modifiedTime,size)").execute()
-        items = results.get("files", [])
-
-        for f in items:
-            fname = f["name"]
-            fid = f["id"]
-            mtime = f.get("modifiedTime", "")
-            ctime = f.get("createdTime", "")
-            fsize = f.get("size", "0")
-            appid = fname.replace(".zip", "")
-            info = await fetch_steam_info(appid)
+        # Hanya leader yang sync Drive; event-nya dipublish ke semua proses lewat cluster backend
+        leader = cluster.try_acquire_leader(LEADER_LEASE_SECONDS)
+        if leader:
+            if not _was_leader and CLUSTER_BACKEND != "memory":
+                notified_files = store.load_notified(time.time() - NOTIFIED_RETENTION_SECONDS)  # state terbaru
+            # sync tetap jalan walau notif off → index /gen selalu fresh
+            events = await poll_folder_changes()
+            ENABLE_UPLOAD_WATCH = cluster.get_flag("upload_watch", ENABLE_UPLOAD_WATCH)
 
-            # NEW
-            if fname not in known_files:
-                known_files[fname] = {"id": fid, "mtime": mtime, "ctime": ctime, "size": fsize}
-                if fname in notified_files:
-                    continue
-                notified_files.add(fname)
-                save_notified(notified_files)
-
-                total_files = count_manifests_in_cache(appid)
-                for gid, conf in list(config.items()):
-                    ch_id = conf.get("upload_channel")
-                    if ch_id and (ch := bot.get_channel(ch_id)):
-                        embed = discord.Embed(
-                            title=f"🆕 New Game Added — {info['name']} ({appid})",
-                            description=f"**{info['name']}** (`{appid}`) ditambahkan ke drive.",
-                            color=discord.Color.blue()
-                        )
-                        if info.get("developer"): embed.add_field(name="👨‍💼 Developer", value=info["developer"], inline=True)
-                        if info.get("release_date"): embed.add_field(name="📅 Release Date", value=info["release_date"], inline=True)
-                        embed.add_field(name="📦 Manifest Files", value=str(total_files), inline=True)
-                        embed.add_field(name="📅 Upload Date", value=ctime[:10], inline=True)
-                        embed.add_field(name="🔗 Links", value=f"[Steam]({info['steam']}) | [SteamDB]({info['steamdb']})", inline=False)
-                        header_url = resolve_header_url(appid, info.get("header"))
-                        if header_url: embed.set_image(url=header_url)
-                        embed.timestamp = discord.utils.utcnow()
-                        embed.set_footer(text="Reported by TechStation Manifest")
-                        await ch.send(embed=embed)
-
-            # UPDATED
-            else:
-                if (known_files[fname]["size"] != fsize) or (known_files[fname]["mtime"] != mtime):
-                    known_files[fname] = {"id": fid, "mtime": mtime, "ctime": ctime, "size": fsize}
-                    total_files = count_manifests_in_cache(appid)
-                    for gid, conf in list(config.items()):
-                        ch_id = conf.get("update_channel")
-                        if ch_id and (ch := bot.get_channel(ch_id)):
-                            embed = discord.Embed(
-                                title=f"♻️ Game Updated — {info['name']} ({appid})",
-                                description=f"**{info['name']}** (`{appid}`) diperbarui (file size berubah).",
-                                color=discord.Color.orange()
-                            )
-                            if info.get("developer"): embed.add_field(name="👨‍💼 Developer", value=info["developer"], inline=True)
-                            if info.get("release_date"): embed.add_field(name="📅 Release Date", value=info["release_date"], inline=True)
-                            embed.add_field(name="📦 Manifest Files", value=str(total_files), inline=True)
-                            embed.add_field(name="📅 Upload Date", value=known_files[fname].get("ctime", "")[:10], inline=True)
-                            embed.add_field(name="🔁 Update Date", value=mtime[:10], inline=True)
-                            embed.add_field(name="📦 New Size", value=f"{int(fsize)//1024} KB", inline=True)
-                            embed.add_field(name="🔗 Links", value=f"[Steam]({info['steam']}) | [SteamDB]({info['steamdb']})", inline=False)
-                            header_url = resolve_header_url(appid, info.get("header"))
-                            if header_url: embed.set_image(url=header_url)
-                            embed.timestamp = discord.utils.utcnow()
-                            embed.set_footer(text="Reported by TechStation Manifest")
-                            await ch.send(embed=embed)
+            published = []
+            newly_notified = []
+            for kind, fname, rec in events:
+                notify = False
+                if ENABLE_UPLOAD_WATCH and kind == "updated":
+                    notify = True
+                # NEW: sekali saja per file (anti-spam)
+                elif ENABLE_UPLOAD_WATCH and kind == "added" and rec.id not in notified_files:
+                    notified_files[rec.id] = time.time()
+                    newly_notified.append(rec.id)
+                    notify = True
+                published.append((kind, fname, rec, notify))
+            if newly_notified:
+                store.add_notified(newly_notified)
+            prune_notified()
+            if published:
+                cluster.publish_events(published)
+            cluster.prune_events(time.time() - EVENT_RETENTION_SECONDS)
+        _was_leader = leader
+
+        pending = []
+        warm = []
+        while True:
+            batch = cluster.read_events(_event_cursor)
+            if not batch:
+                break
+            _event_cursor = batch[-1][0]
+            for _, kind, fname, rec, notify in batch:
+                if not leader:
+                    apply_remote_event(kind, fname, rec)
+                if notify:
+                    pending.append((kind, fname, rec))
+                elif kind != "removed":
+                    warm.append((kind, fname, rec))
+        if not leader:
+            folder_index.mark_synced()
+        # embed file yang tidak dinotif tetap disiapkan di background; skip kalau prewarm sebelumnya belum selesai
+        if warm and (_prewarm_task is None or _prewarm_task.done()):
+            _prewarm_task = asyncio.ensure_future(prewarm_embeds(warm))
+        if not pending:
+            return
+
+        # embed dibangun sekali per file event, lalu dipakai untuk semua guild
+        build_sem = asyncio.Semaphore(NOTIFY_BUILD_CONCURRENCY)
+        async def build(ev):
+            async with build_sem:
+                return await build_file_embed(*ev)
+        built = await asyncio.gather(*(build(ev) for ev in pending))
+
+        for (kind, fname, rec), (embed, line) in zip(pending, built):
+            conf_key = "upload_channel" if kind == "added" else "update_channel"
+            for gid, conf in list(config.items()):
+                ch_id = conf.get(conf_key)
+                if ch_id:
+                    notifier.add(ch_id, kind, embed, line)
+        await notifier.flush()
 
     except Exception as e:
         print("check_new_files error:", e)
 
+# =============== METRICS COLLECTORS ===============
+@metrics.collector
+def collect_runtime_metrics():
+    for cache_name, c in (("steam", steam_cache), ("header", header_cache), ("manifest", manifest_cache),
+                          ("embed", embed_cache)):
+        yield "cache_hits_total", "Cache hits", "counter", {"cache": cache_name}, c.hits
+        yield "cache_misses_total", "Cache misses", "counter", {"cache": cache_name}, c.misses
+    yield "cache_entries", "Entries in cache", "gauge", {"cache": "steam"}, len(steam_cache)
+    yield "cache_entries", "Entries in cache", "gauge", {"cache": "header"}, len(header_cache)
+    yield "cache_entries", "Entries in cache", "gauge", {"cache": "embed"}, len(embed_cache)
+    yield "manifest_cache_bytes", "Bytes held by manifest cache", "gauge", {"tier": "disk"}, manifest_cache.total_bytes
+    yield "manifest_cache_bytes", "Bytes held by manifest cache", "gauge", {"tier": "memory"}, manifest_cache.memory_bytes
+    yield "known_files", "Files tracked in folder index", "gauge", {}, len(known_files)
+    yield "gen_queue_depth", "Jobs waiting in /gen queue", "gauge", {}, gen_scheduler.queued
+    yield "gen_coalesced_total", "/gen requests joined to an in-flight job", "counter", {}, gen_scheduler.coalesced
+    yield "gen_shed_total", "/gen requests rejected by overload shedding", "counter", {}, gen_scheduler.shed
+    yield "cluster_leader", "1 if this process holds the Drive sync lease", "gauge", {"node": NODE_ID}, int(_was_leader)
+
+# =============== MEMORY REPORT ===============
+def _deep_size(root, seen: set) -> int:
+    """sys.getsizeof rekursif; objek yang sudah dihitung (string dipakai bersama/intern) tidak dihitung lagi."""
+    total = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif isinstance(obj, FileRecord):
+            stack.extend((obj.id, obj.mtime, obj.ctime, obj.size))
+    return total
+
+def memory_report() -> dict:
+    """Byte state folder yang tumbuh seiring jumlah file. Mahal (O(n)) → panggil via asyncio.to_thread."""
+    seen = set()
+    parts = {
+        "known_files": _deep_size(known_files, seen),
+        "known_ids": _deep_size(known_ids, seen),
+        "folder_index": _deep_size([folder_index.by_appid, folder_index.sorted_names, folder_index.sorted_appids,
+                                    folder_index.game_names, folder_index._name_tokens], seen),
+        "notified": _deep_size(notified_files, seen),
+    }
+    total = sum(parts.values())
+    n = len(known_files)
+    report = {"files": n, "notified_entries": len(notified_files), "bytes": parts, "total_bytes": total,
+              "bytes_per_file": round(total / n, 1) if n else 0.0}
+    if resource is not None:
+        report["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return report
+
+MEMORY_REPORT_MIN_INTERVAL = 30.0
+_memory_report_task = None
+_memory_report_at = 0.0
+
+async def memory_endpoint(request):
+    global _memory_report_task, _memory_report_at
+    if not debug_authorized(request):
+        raise web.HTTPUnauthorized(text="Butuh Authorization: Bearer <DEBUG_TOKEN>.")
+    # satu walk sekaligus, hasilnya dipakai ulang sebentar → request beruntun tidak menumpuk di executor
+    stale = time.monotonic() - _memory_report_at > MEMORY_REPORT_MIN_INTERVAL
+    if _memory_report_task is None or (_memory_report_task.done() and stale):
+        _memory_report_task = asyncio.ensure_future(asyncio.to_thread(memory_report))
+        _memory_report_at = time.monotonic()
+    return web.json_response(await asyncio.shield(_memory_report_task))
+
+if DEBUG_TOKEN:
+    web_app.router.add_get("/debug/memory", memory_endpoint)
+
+# =============== CACHE SNAPSHOT ===============
+@tasks.loop(minutes=5)
+async def persist_caches():
+    if STEAM_CACHE_FILE:
+        data = steam_cache.snapshot()
+        try:
+            await asyncio.to_thread(write_json_atomic, STEAM_CACHE_FILE, data)
+        except Exception as e:
+            print("persist_caches error:", e)
+
 # =============== OWNER-ONLY GUARD ===============
 def _owner_only(interaction: discord.Interaction) -> bool:
     return interaction.guild is not None and interaction.user.id == interaction.guild.owner_id
@@ -433,10 +2772,11 @@ async def notif(interaction: discord.Interaction, mode: str):
         m = mode.lower()
         if m == "on":
             ENABLE_UPLOAD_WATCH = True
-            initialize_known_files()
+            cluster.set_flag("upload_watch", True)
             await interaction.followup.send("🔔 Notifikasi Drive: **AKTIF**")
         elif m == "off":
             ENABLE_UPLOAD_WATCH = False
+            cluster.set_flag("upload_watch", False)
             await interaction.followup.send("🔕 Notifikasi Drive: **NONAKTIF**")
         else:
             await interaction.followup.send("Gunakan `/notif on` atau `/notif off`")
@@ -444,6 +2784,26 @@ async def notif(interaction: discord.Interaction, mode: str):
         traceback.print_exc()
         await interaction.followup.send(f"⚠️ Gagal set notif: {e}", ephemeral=True)
 
+# =============== /stalls (OWNER ONLY) ===============
+@tree.command(name="stalls", description="🩺 Top call site yang nge-block event loop (DIAG_STALL=1)")
+async def stalls(interaction: discord.Interaction, reset: bool = False):
+    if not _owner_only(interaction):
+        await interaction.response.send_message("❌ Hanya owner server yang boleh pakai command ini.", ephemeral=True)
+        return
+    if stall_detector is None:
+        await interaction.response.send_message("Diagnostik nonaktif. Jalankan bot dengan `DIAG_STALL=1`.", ephemeral=True)
+        return
+    top = stall_detector.top(10)
+    if reset:
+        stall_detector.reset()
+    if not top:
+        await interaction.response.send_message(
+            f"✅ Belum ada stall > {DIAG_STALL_THRESHOLD:.2f}s sejak start/reset.", ephemeral=True)
+        return
+    lines = [f"{st['count']:>4}x  total {st['total']:7.2f}s  max {st['max']:6.2f}s  {site}" for site, st in top]
+    text = f"🩺 Event loop stall > {DIAG_STALL_THRESHOLD:.2f}s (per call site):\n```\n" + "\n".join(lines)
+    await interaction.response.send_message(text[:1990] + "\n```", ephemeral=True)
+
 # =============== channel setup (OWNER ONLY) ===============
 @tree.command(name="channeluploadsetup", description="📌 Set channel untuk notif file baru (Added)")
 async def channeluploadsetup(interaction: discord.Interaction, channel: discord.TextChannel):
@@ -454,7 +2814,7 @@ async def channeluploadsetup(interaction: discord.Interaction, channel: discord.
     try:
         ensure_guild_config(interaction.guild_id)
         config[str(interaction.guild_id)]["upload_channel"] = channel.id
-        save_config(config)
+        save_guild_config(interaction.guild_id)
         await interaction.followup.send(f"✅ Channel Added diset ke {channel.mention}")
     except Exception as e:
         traceback.print_exc()
@@ -469,7 +2829,7 @@ async def channelupdatesetup(interaction: discord.Interaction, channel: discord.
     try:
         ensure_guild_config(interaction.guild_id)
         config[str(interaction.guild_id)]["update_channel"] = channel.id
-        save_config(config)
+        save_guild_config(interaction.guild_id)
         await interaction.followup.send(f"✅ Channel Updated diset ke {channel.mention}")
     except Exception as e:
         traceback.print_exc()
@@ -485,7 +2845,7 @@ async def channelrequestsetup(interaction: discord.Interaction, channel: discord
         ensure_guild_config(interaction.guild_id)
         config[str(interaction.guild_id)]["request_channel"] = channel.id
         config[str(interaction.guild_id)]["request_role"] = role.id if role else None
-        save_config(config)
+        save_guild_config(interaction.guild_id)
         txt = f"✅ Channel Request diset ke {channel.mention}"
         if role:
             txt += f" dan role mention diset ke {role.mention}"
@@ -507,14 +2867,100 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
         pass
 
 # =============== ON READY ===============
+FORCE_TREE_SYNC = os.getenv("FORCE_TREE_SYNC", "") == "1"
+_startup_done = False
+_loop_lag_task = None
+
+def command_tree_hash() -> str:
+    payload = []
+    for cmd in tree.get_commands():
+        try:
+            payload.append(cmd.to_dict(tree))
+        except TypeError:  # discord.py < 2.4
+            payload.append(cmd.to_dict())
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_command_tree():
+    """tree.sync() hanya kalau definisi command berubah sejak sync terakhir."""
+    key = f"command_hash:{bot.application_id}"
+    digest = command_tree_hash()
+    if not FORCE_TREE_SYNC and store.get_kv(key) == digest:
+        print("Command tree unchanged, skip sync.")
+        return
+    await tree.sync()
+    store.set_kv(key, digest)
+    print("Command tree synced.")
+
 @bot.event
 async def on_ready():
-    await tree.sync()
+    global _startup_done, _loop_lag_task, _event_cursor
     print(f"Bot logged in as {bot.user} — in {len(bot.guilds)} guilds")
-    initialize_known_files()
-    check_new_files.start()
+    # on_ready bisa terpanggil lagi saat reconnect → init cukup sekali
+    if _startup_done:
+        return
+    _startup_done = True
+    try:
+        await sync_command_tree()
+    except Exception as e:
+        print("Command tree sync error:", e)
+    # cursor event diambil sebelum snapshot → event yang masuk di antaranya tetap ter-apply (idempotent)
+    _event_cursor = cluster.last_event_id()
+    # snapshot ada → lanjut dari page token; kalau tidak, tick pertama (leader) yang bootstrap
+    await load_known_files_snapshot()
+    if not check_new_files.is_running():
+        check_new_files.start()
+    if not persist_caches.is_running():
+        persist_caches.start()
+    if _loop_lag_task is None or _loop_lag_task.done():
+        _loop_lag_task = asyncio.ensure_future(monitor_loop_lag())
+    if stall_detector is not None:
+        stall_detector.start()
+
+# =============== CLUSTER LAUNCHER ===============
+def run_cluster():
+    """Spawn CLUSTER_PROCESSES proses bot; shard dibagi round-robin, state lewat SQLite bersama.
+    Hanya proses 0 yang menjalankan web server (PORT). Cache manifest disk per proses (subfolder sendiri,
+    MANIFEST_CACHE_MAX_BYTES dibagi rata) → total disk tetap sesuai batas, proses tidak saling evict."""
+    total = SHARD_COUNT or CLUSTER_PROCESSES
+    # proses tanpa shard akan konek ke semua shard (SHARD_IDS kosong) → jumlah proses dibatasi jumlah shard
+    workers = min(CLUSTER_PROCESSES, total)
+    if workers < CLUSTER_PROCESSES:
+        print(f"CLUSTER_PROCESSES={CLUSTER_PROCESSES} > SHARD_COUNT={total}, hanya menjalankan {workers} proses")
+    procs = []
+    for i in range(workers):
+        ids = [str(sid) for sid in range(total) if sid % workers == i]
+        env = dict(os.environ, CLUSTER_PROCESSES="1", SHARD_COUNT=str(total), SHARD_IDS=",".join(ids),
+                   CLUSTER_BACKEND="sqlite", WEB_ENABLED="1" if i == 0 else "0",
+                   MANIFEST_CACHE_DIR=os.path.join(MANIFEST_CACHE_DIR, f"proc{i}"),
+                   MANIFEST_CACHE_MAX_BYTES=str(MANIFEST_CACHE_MAX_BYTES // workers))
+        procs.append(subprocess.Popen([sys.executable, os.path.abspath(__file__)], env=env))
+        print(f"Started cluster process {i} (pid {procs[-1].pid}) shards {ids}")
+    try:
+        for proc in procs:
+            proc.wait()
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+
+async def run_bot():
+    """Web server dan bot satu event loop; web listen duluan supaya health check tidak menunggu login."""
+    if WEB_ENABLED:
+        await start_web()
+    try:
+        async with bot:
+            await bot.start(DISCORD_TOKEN)
+    finally:
+        await stop_web()
+        await close_http_session()
 
 # =============== START ===============
 if __name__ == "__main__":
-    keep_alive()
-    bot.run(DISCORD_TOKEN)
+    if CLUSTER_PROCESSES > 1:
+        run_cluster()
+    else:
+        discord.utils.setup_logging()
+        try:
+            asyncio.run(run_bot())
+        except KeyboardInterrupt:
+            pass